@@ -0,0 +1,61 @@
+'''
+Conversions between Python objects and FreeFem++ files or console output.
+'''
+
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+
+from .common import pyff, mesh_sizes, square_mesh, mesh_to_FreeFem_str, matrix_to_FreeFem_str
+
+class TimeSaveMesh :
+
+    params = mesh_sizes
+    param_names = [ 'n' ]
+
+    def setup( self, n ) :
+        self.Th = square_mesh( n )
+        self.file = NamedTemporaryFile( suffix = '.msh', mode = 'w' )
+
+    def teardown( self, n ) :
+        self.file.close()
+
+    def time_savemesh( self, n ) :
+        pyff.savemesh( self.Th, self.file )
+
+class TimeSaveVector :
+
+    params = mesh_sizes
+    param_names = [ 'n' ]
+
+    def setup( self, n ) :
+        self.u = np.random.default_rng( 0 ).random( n*n )
+        self.file = NamedTemporaryFile( suffix = '.ffv', mode = 'w' )
+
+    def teardown( self, n ) :
+        self.file.close()
+
+    def time_savevector( self, n ) :
+        pyff.savevector( self.u, self.file )
+
+class TimeParseOutput :
+
+    params = mesh_sizes
+    param_names = [ 'n' ]
+
+    def setup( self, n ) :
+
+        Th = square_mesh( n )
+
+        self.mesh_str = mesh_to_FreeFem_str( Th )
+        self.matrix_str = matrix_to_FreeFem_str( pyff.P1_stiffness( Th ) )
+        self.data_str = '\n'.join( [ '%.6g %.6g %d' % node for node in zip( Th.x, Th.y, Th.node_labels ) ] )
+
+    def time_FreeFem_str_to_mesh( self, n ) :
+        pyff.FreeFem_str_to_mesh( self.mesh_str )
+
+    def time_FreeFem_str_to_matrix( self, n ) :
+        pyff.FreeFem_str_to_matrix( self.matrix_str )
+
+    def time_loadstr( self, n ) :
+        pyff.loadstr( self.data_str )
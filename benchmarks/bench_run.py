@@ -0,0 +1,42 @@
+'''
+End-to-end script runs, with a fake FreeFem++ which replays a recorded output.
+'''
+
+import os
+from tempfile import mkdtemp
+
+import numpy as np
+
+from .common import pyff, mesh_sizes, square_mesh, record_output, use_fake_FreeFem, restore_environment
+
+class TimeGetOutput :
+
+    params = mesh_sizes
+    param_names = [ 'n' ]
+
+    def setup( self, n ) :
+
+        Th = square_mesh( n )
+
+        self.recording = os.path.join( mkdtemp(), 'output.txt' )
+        record_output( self.recording, Th = Th, u = Th.x*Th.y, stiffness = pyff.P1_stiffness( Th ) )
+        self.saved_environment = use_fake_FreeFem( self.recording )
+
+        self.Th = Th
+
+        self.script = pyff.InputScript( Th = 'mesh' )
+        self.script += pyff.OutputScript( Th = 'mesh', u = 'vector' )
+        self.script += pyff.VarfScript( stiffness = 'int2d(Th)( dx(u)*dx(v) + dy(u)*dy(v) )' )
+
+    def teardown( self, n ) :
+        restore_environment( self.saved_environment )
+        self.script.clean_temp_files()
+        os.remove( self.recording )
+        os.rmdir( os.path.dirname( self.recording ) )
+
+    def time_get_output( self, n ) :
+        self.Th.invalidate() # the mesh is saved at each run
+        self.script.get_output( Th = self.Th )
+
+    def time_get_output_same_mesh( self, n ) :
+        self.script.get_output( Th = self.Th )
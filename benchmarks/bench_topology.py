@@ -0,0 +1,52 @@
+'''
+Mesh topology: boundaries, segments, triangulation and export.
+'''
+
+import numpy as np
+
+from .common import pyff, mesh_sizes, square_mesh, polygon, subdivided_square
+from pyFreeFem.meshTools.segments import edges_to_segments
+from pyFreeFem.meshTools.triangulate import triangulate_polygon
+from pyFreeFem.meshTools.export_to_json import export_to_json
+
+class TimeBoundaries :
+
+    params = mesh_sizes
+    param_names = [ 'n' ]
+
+    def setup( self, n ) :
+
+        self.Th = square_mesh( n )
+
+        # boundary edges in random order, as FreeFem++ may list them
+        edges = self.Th.get_boundary_edge_array( label_type = 'int' )[:,:2]
+        self.edges = edges[ np.random.default_rng( 0 ).permutation( len( edges ) ) ].tolist()
+
+    def time_edges_to_segments( self, n ) :
+        edges_to_segments( self.edges )
+
+    def time_get_boundaries( self, n ) :
+        self.Th.invalidate_boundaries() # otherwise cached
+        self.Th.get_boundaries()
+
+    def time_export_to_json( self, n ) :
+        export_to_json( self.Th )
+
+class TimeTriangulatePolygon :
+
+    params = [ 20, 100, 400 ]
+    param_names = [ 'nb_vertices' ]
+
+    def setup( self, nb_vertices ) :
+
+        self.x, self.y = polygon( nb_vertices )
+
+        # collinear vertices, and a hole aligned with the outer boundary
+        self.x_square, self.y_square = subdivided_square( nb_vertices//4 )
+        self.hole = subdivided_square( nb_vertices//8, size = .4 )
+
+    def time_triangulate_polygon( self, nb_vertices ) :
+        triangulate_polygon( self.x, self.y )
+
+    def time_triangulate_square_with_hole( self, nb_vertices ) :
+        triangulate_polygon( self.x_square, self.y_square, holes = [ self.hole ] )
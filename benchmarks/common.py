@@ -0,0 +1,153 @@
+'''
+Meshes and recorded FreeFem++ outputs shared by the benchmarks.
+'''
+
+import os
+import sys
+
+import numpy as np
+
+benchmark_dir = os.path.dirname( os.path.abspath( __file__ ) )
+sys.path.insert( 0, os.path.dirname( benchmark_dir ) ) # the working copy, not an installed pyFreeFem
+
+import pyFreeFem as pyff
+from pyFreeFem.FreeFemTools.edpTools import flagize
+
+# number of nodes along each side of the square meshes
+mesh_sizes = [ 10, 30, 100 ]
+
+fake_FreeFem_dir = os.path.join( benchmark_dir, 'fake_FreeFem' )
+
+def square_mesh( n ) :
+    '''
+    Structured mesh of the unit square, with ( n - 1 )**2*2 triangles and labelled sides.
+    '''
+
+    x, y = np.meshgrid( np.linspace( 0, 1, n ), np.linspace( 0, 1, n ) )
+
+    nodes = np.arange( n*n ).reshape( ( n, n ) )
+    lower_left, lower_right, upper_left, upper_right = nodes[:-1,:-1].ravel(), nodes[:-1,1:].ravel(), nodes[1:,:-1].ravel(), nodes[1:,1:].ravel()
+
+    triangles = np.concatenate( [ np.column_stack( ( lower_left, lower_right, upper_right ) ), np.column_stack( ( lower_left, upper_right, upper_left ) ) ] )
+
+    Th = pyff.TriMesh( x.ravel(), y.ravel(), triangles = triangles )
+
+    Th.add_boundary_edges( nodes[0,:], 'bottom' )
+    Th.add_boundary_edges( nodes[:,-1], 'right' )
+    Th.add_boundary_edges( nodes[-1,::-1], 'top' )
+    Th.add_boundary_edges( nodes[::-1,0], 'left' )
+
+    return Th
+
+def polygon( n ) :
+    '''
+    Counterclockwise star-shaped polygon with n vertices (not convex).
+    '''
+
+    theta = np.linspace( 0, 2*np.pi, n, endpoint = False )
+    r = 1 + .3*np.cos( 7*theta )
+
+    return r*np.cos( theta ), r*np.sin( theta )
+
+def subdivided_square( n, center = ( .5, .5 ), size = 1. ) :
+    '''
+    Counterclockwise square with n vertices per side (collinear vertices along each side).
+    '''
+
+    t = np.linspace( -size/2, size/2, n, endpoint = False )
+    side = np.full( n, size/2 )
+
+    x = np.concatenate( [ t, side, -t, -side ] ) + center[0]
+    y = np.concatenate( [ -side, t, side, -t ] ) + center[1]
+
+    return x, y
+
+###################################
+#
+# FreeFem++ CONSOLE OUTPUT
+#
+###################################
+
+def add_flags( output_str, name ) :
+    return flagize( name ) + '\n' + output_str + flagize( name ) + '\n'
+
+def mesh_to_FreeFem_str( Th ) :
+    '''
+    Mesh as printed by FreeFem++ (see export_mesh_edp).
+    '''
+
+    boundaries = Th.get_boundary_edge_array( label_type = 'int' )
+
+    output_str = add_flags( ''.join( [ '%.6g %.6g %d\n' % node for node in zip( Th.x, Th.y, Th.node_labels ) ] ), 'nodes' )
+    output_str += add_flags( ''.join( [ '%d %d %d %d\n' % ( *triangle, label ) for triangle, label in zip( Th.triangles.tolist(), Th.triangle_labels ) ] ), 'triangles' )
+    output_str += add_flags( ''.join( [ '%d %d %d\n' % tuple( edge ) for edge in boundaries.tolist() ] ), 'boundaries' )
+
+    return output_str
+
+def matrix_to_FreeFem_str( M ) :
+    '''
+    Sparse matrix as printed by FreeFem++ (cout << M).
+    '''
+
+    M = M.tocoo()
+
+    output_str = '#  HashMatrix Matrix (COO) 0x5596934\n'
+    output_str += '#    n       m        nnz     half     fortran   state  \n'
+    output_str += '%d %d %d 0 0 0 0\n' % ( M.shape[0], M.shape[1], M.nnz )
+    output_str += ''.join( [ '%10d %10d %.20g\n' % entry for entry in zip( M.row.tolist(), M.col.tolist(), M.data.tolist() ) ] )
+
+    return output_str
+
+def vector_to_FreeFem_str( u ) :
+    return ''.join( [ '%.6g\n' % value for value in u ] )
+
+def record_output( file_name, **outputs ) :
+    '''
+    Write the FreeFem++ console output of a script which exports outputs (TriMesh, sparse matrix or vector), for the fake FreeFem++ to replay.
+    '''
+
+    output_str = '-- FreeFem++ v4.6 (fake)\n'
+
+    for name, value in outputs.items() :
+
+        if isinstance( value, pyff.TriMesh ) :
+            output_str += add_flags( mesh_to_FreeFem_str( value ), name )
+
+        elif hasattr( value, 'tocoo' ) :
+            output_str += add_flags( matrix_to_FreeFem_str( value ), name )
+
+        else :
+            output_str += add_flags( vector_to_FreeFem_str( value ), name )
+
+    with open( file_name, 'w' ) as the_file :
+        the_file.write( output_str )
+
+    return file_name
+
+def use_fake_FreeFem( recording ) :
+    '''
+    Put the fake FreeFem++ first in the PATH, and make it replay recording (a file written by record_output).
+
+    saved_environment = use_fake_FreeFem( recording )
+
+    saved_environment is to be passed to restore_environment, once the benchmark is over.
+    '''
+
+    saved_environment = { name : os.environ.get( name ) for name in ( 'PATH', 'FAKE_FREEFEM_OUTPUT' ) }
+
+    os.environ['PATH'] = fake_FreeFem_dir + os.pathsep + os.environ['PATH']
+    os.environ['FAKE_FREEFEM_OUTPUT'] = recording
+
+    return saved_environment
+
+def restore_environment( saved_environment ) :
+    '''
+    Set back the environment variables saved by use_fake_FreeFem (variables which did not exist are removed).
+    '''
+
+    for name, value in saved_environment.items() :
+
+        if value is None :
+            os.environ.pop( name, None )
+        else :
+            os.environ[name] = value
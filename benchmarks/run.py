@@ -0,0 +1,97 @@
+'''
+Runs the benchmarks without asv, with timeit.
+
+python benchmarks/run.py [pattern] [--repeat 5]
+
+Only the benchmarks whose name contains pattern are run. For each parameter, prints the best time of repeat runs.
+'''
+
+import os
+import sys
+import timeit
+import argparse
+import importlib
+from itertools import product
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ) )
+
+benchmark_modules = [ 'benchmarks.bench_io', 'benchmarks.bench_topology', 'benchmarks.bench_run' ]
+
+def get_benchmarks( pattern = '' ) :
+    '''
+    List of ( name, class, method name ), asv-style: classes whose name starts with Time, methods whose name starts with time_.
+    '''
+
+    benchmarks = []
+
+    for module_name in benchmark_modules :
+
+        module = importlib.import_module( module_name )
+
+        for class_name in dir( module ) :
+
+            if class_name.startswith( 'Time' ) :
+
+                benchmark_class = getattr( module, class_name )
+
+                for method_name in dir( benchmark_class ) :
+
+                    name = module_name.split('.')[-1] + '.' + class_name + '.' + method_name
+
+                    if method_name.startswith( 'time_' ) and pattern in name :
+                        benchmarks += [ ( name, benchmark_class, method_name ) ]
+
+    return benchmarks
+
+def get_parameters( benchmark_class ) :
+
+    params = getattr( benchmark_class, 'params', [] )
+
+    if len( params ) == 0 :
+        return [ () ]
+
+    if not isinstance( params[0], list ) : # a single parameter
+        params = [ params ]
+
+    return list( product( *params ) )
+
+def time_benchmark( benchmark_class, method_name, parameters, repeat = 5 ) :
+    '''
+    Best time of one call, in seconds.
+    '''
+
+    benchmark = benchmark_class()
+
+    if hasattr( benchmark, 'setup' ) :
+        benchmark.setup( *parameters )
+
+    try :
+        method = getattr( benchmark, method_name )
+        timer = timeit.Timer( lambda : method( *parameters ) )
+        number, _ = timer.autorange()
+
+        return min( timer.repeat( repeat = repeat, number = number ) )/number
+
+    finally :
+        if hasattr( benchmark, 'teardown' ) :
+            benchmark.teardown( *parameters )
+
+def format_time( seconds ) :
+
+    for unit, scale in ( 's', 1 ), ( 'ms', 1e-3 ), ( 'us', 1e-6 ) :
+        if seconds >= scale :
+            return '%.3g %s' % ( seconds/scale, unit )
+
+    return '%.3g ns' % ( seconds/1e-9 )
+
+if __name__ == '__main__' :
+
+    parser = argparse.ArgumentParser( description = 'Run pyFreeFem benchmarks with timeit.' )
+    parser.add_argument( 'pattern', nargs = '?', default = '', help = 'run only the benchmarks whose name contains pattern' )
+    parser.add_argument( '--repeat', type = int, default = 5 )
+    arguments = parser.parse_args()
+
+    for name, benchmark_class, method_name in get_benchmarks( arguments.pattern ) :
+        for parameters in get_parameters( benchmark_class ) :
+            seconds = time_benchmark( benchmark_class, method_name, parameters, repeat = arguments.repeat )
+            print( '%-65s %-12s %10s' % ( name, ', '.join( map( str, parameters ) ), format_time( seconds ) ) )
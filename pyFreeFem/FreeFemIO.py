@@ -27,13 +27,20 @@ import numpy as np
 import re
 import csv
 import subprocess
-from scipy.sparse import csr_matrix
+import asyncio
+from os import cpu_count
+from weakref import WeakKeyDictionary
+from collections import deque
+from hashlib import sha256
+from scipy.sparse import csr_matrix, csc_matrix, coo_matrix
 from tempfile import NamedTemporaryFile
 import warnings
 from platform import system
 
 from .TriMesh import TriMesh #, triangle_edge_to_node_edge
-from .meshTools.segments import triangle_edge_to_node_edge
+from .meshTools.segments import triangle_edge_to_node_edge, DirectedEdgeIndex
+from .meshTools.boundary_edges import BoundaryEdges
+from .RunStats import RunStats, ResourcePopen, get_children_usage
 from .FreeFemTools.FreeFemStatics import *
 from .FreeFemTools.edpTools import *
 
@@ -57,9 +64,58 @@ default_sparse_matrix = csr_matrix
 def array1D_to_str( a ) :
     return ' '.join( [ str(a) for a in a ] )
 
-def parse_FreeFem_output( FreeFem_str, flag ) :
+flag_line_pattern = re.compile( '^' + re.escape( flagize( '' ) ) + '.*$', flags = re.MULTILINE )
 
-    return FreeFem_str.split( flag + '\n' )[1]
+def get_flag_line_pattern( flags = () ) :
+    '''
+    Pattern of the flag lines: the standard ones ( '# FLAG > ...' ), and the custom flags provided.
+    '''
+
+    custom_flags = [ flag for flag in flags if not flag.startswith( flagize( '' ) ) ]
+
+    if len( custom_flags ) == 0 :
+        return flag_line_pattern
+
+    return re.compile( '^(?:' + '|'.join( [ re.escape( flagize( '' ) ) + '.*' ] + [ re.escape( flag ) for flag in custom_flags ] ) + ')$', flags = re.MULTILINE )
+
+def index_FreeFem_output( FreeFem_str, flags = () ) :
+    '''
+    Locate all flagged outputs in a single pass over the FreeFem++ output.
+
+    index = index_FreeFem_output( FreeFem_str, flags = () )
+
+    index[flag] is the list of ( start, end ) positions of the text enclosed by successive pairs of flag lines.
+    Only the standard flags ( '# FLAG > ...' ) are found, unless other flags are listed in flags.
+    '''
+
+    index = {}
+    start_positions = {}
+
+    for flag_line in get_flag_line_pattern( flags ).finditer( FreeFem_str ) :
+
+        flag = flag_line.group()
+
+        try :
+            index.setdefault( flag, [] ).append( ( start_positions.pop( flag ), flag_line.start() ) ) # closing flag
+        except KeyError :
+            start_positions[flag] = flag_line.end() + 1 # opening flag, the content starts on next line
+
+    return index
+
+def parse_FreeFem_output( FreeFem_str, flag, index = None, occurrence = 0 ) :
+    '''
+    Text between the first two occurences of flag. If index (from index_FreeFem_output) is provided, FreeFem_str is not searched again,
+    unless flag is missing from the index (e.g. a custom flag).
+
+    occurrence (int) : rank of the flagged output, when the same flag is printed several times (e.g. in a loop)
+    '''
+
+    if index is None or flag not in index :
+        return FreeFem_str.split( flag + '\n' )[ 1 + 2*occurrence ]
+
+    start, end = index[flag][occurrence]
+
+    return FreeFem_str[ start:end ]
 
 def parse_FreeFem_error_message( message ) :
     '''
@@ -71,19 +127,25 @@ def parse_FreeFem_error_message( message ) :
     except :
         return None
 
-def FreeFem_str_to_matrix( FreeFem_str, matrix_name = None, flag = None, sparse_matrix = None, verbose = False, max_header_length = 15 ) :
+sparse_matrix_formats = { 'csr' : csr_matrix, 'csc' : csc_matrix, 'coo' : coo_matrix }
+
+def FreeFem_str_to_matrix( FreeFem_str, matrix_name = None, flag = None, sparse_matrix = None, verbose = False, max_header_length = 15, index_dtype = np.int32 ) :
     '''
+    Parse a matrix printed by FreeFem++ (cout << M).
+
+    Arguments:
+        sparse_matrix : sparse matrix class, 'csr', 'csc', 'coo', or 'raw' for ( ( coef, (I, J) ), ( nb_row, nb_col ) ). Defaults to default_sparse_matrix.
+        index_dtype : type of the I and J index arrays
     '''
 
     if not flag is None :
-        FreeFem_lines = parse_FreeFem_output( FreeFem_str, flag ).split('\n')
+        FreeFem_str = parse_FreeFem_output( FreeFem_str, flag )
 
     elif not matrix_name is None:
         flag = flagize( matrix_name ) # '# MATRIX ' + matrix_name
-        FreeFem_lines = parse_FreeFem_output( FreeFem_str, flag ).split('\n')
+        FreeFem_str = parse_FreeFem_output( FreeFem_str, flag )
 
-    else :
-        FreeFem_lines = FreeFem_str.split('\n')
+    FreeFem_lines = FreeFem_str.split( '\n', max_header_length ) # the last item is the rest of the string
 
     for line_index in range( max_header_length ) :
 
@@ -103,11 +165,11 @@ def FreeFem_str_to_matrix( FreeFem_str, matrix_name = None, flag = None, sparse_
         nb_row, nb_col, nb_coef, _, _, _, _ = header_numbers # FreeFem++ 4.6
         python_style_index = True # indices start at 0
 
-    I, J, coef = loadstr( '\n'.join(  FreeFem_lines[ line_index + 1 : line_index + 1 + nb_coef ] ) ).T
+    coefficients = np.fromstring( '\n'.join( FreeFem_lines[ line_index + 1 : ] ), sep = ' ', count = 3*nb_coef )
 
-    I = np.array([ int(x) for x in I ] )
-    J = np.array([ int(x) for x in J ] )
-    coef = np.array( [ float(x) for x in coef ] )
+    I = coefficients[0::3].astype( index_dtype )
+    J = coefficients[1::3].astype( index_dtype )
+    coef = coefficients[2::3]
 
     if not python_style_index :
         I -= 1
@@ -121,28 +183,103 @@ def FreeFem_str_to_matrix( FreeFem_str, matrix_name = None, flag = None, sparse_
 
 
     if sparse_matrix is None :
-        return default_sparse_matrix( ( coef, (I, J) ), ( nb_row, nb_col ) )
+        sparse_matrix = default_sparse_matrix
 
     elif sparse_matrix == 'raw' :
         return ( coef, (I, J) ), ( nb_row, nb_col )
 
-    else :
-        return sparse_matrix( ( coef, (I, J) ), ( nb_row, nb_col ) )
+    elif isinstance( sparse_matrix, str ) :
+        sparse_matrix = sparse_matrix_formats[ sparse_matrix ]
+
+    return sparse_matrix( ( coef, (I, J) ), ( nb_row, nb_col ) )
 
 def FreeFem_str_to_vector( Freefem_str, dtype = 'float' ) :
     return  loadstr( Freefem_str[:-1], dtype = dtype ).flatten( )
 
 def FreeFem_str_to_mesh( FreeFem_str ) :
 
-    FreeFem_str = '\n' + FreeFem_str + '\n'
+    index = index_FreeFem_output( FreeFem_str )
 
     FreeFem_mesh = {}
 
     for key in ['triangles', 'boundaries'] :
-        FreeFem_mesh[key] = loadstr( FreeFem_str.split( '\n' + flagize(key) + '\n' )[1], dtype = 'int' )
+        FreeFem_mesh[key] = loadstr( parse_FreeFem_output( FreeFem_str, flagize(key), index )[:-1], dtype = 'int' )
 
     for key in ['nodes'] :
-        FreeFem_mesh[key] = loadstr( FreeFem_str.split( '\n' + flagize(key) + '\n' )[1], dtype = 'float' )
+        FreeFem_mesh[key] = loadstr( parse_FreeFem_output( FreeFem_str, flagize(key), index )[:-1], dtype = 'float' )
+
+    return FreeFem_arrays_to_mesh( **FreeFem_mesh )
+
+def FreeFem_file_to_array( file_name ) :
+    '''
+    Reads the numbers written by export_file_edp. Complex numbers, written as ( re, im ) by FreeFem++, are not supported.
+    '''
+
+    with open( file_name ) as file :
+        FreeFem_str = file.read()
+
+    if '(' in FreeFem_str :
+        raise ValueError( 'Complex numbers cannot be read from ' + file_name + ', use the stdout channel.' )
+
+    return np.fromstring( FreeFem_str, sep = ' ' )
+
+def FreeFem_file_to_mesh( file_name ) :
+    '''
+    Reads a mesh written by export_file_edp( 'mesh' ).
+    '''
+
+    data = FreeFem_file_to_array( file_name )
+
+    nv, nt, nbe = data[:3].astype( int )
+
+    nodes, triangles, boundaries = np.split( data[3:], [ 3*nv, 3*nv + 4*nt ] )
+
+    return FreeFem_arrays_to_mesh(
+        nodes = nodes.reshape( ( nv, 3 ) ),
+        triangles = triangles.reshape( ( nt, 4 ) ).astype( int ),
+        boundaries = boundaries.reshape( ( nbe, 3 ) ).astype( int )
+        )
+
+def FreeFem_file_to_matrix( file_name, sparse_matrix = None ) :
+    '''
+    Reads a matrix written by export_file_edp( 'matrix' ).
+    '''
+
+    data = FreeFem_file_to_array( file_name )
+
+    nb_row, nb_col, nb_coef = data[:3].astype( int )
+
+    I, J, coef = data[2:].reshape( ( 3, nb_coef + 1 ) )[:,1:] # each array is preceded by its length
+
+    I = I.astype( np.int32 )
+    J = J.astype( np.int32 )
+
+    if sparse_matrix is None :
+        sparse_matrix = default_sparse_matrix
+
+    elif isinstance( sparse_matrix, str ) :
+        sparse_matrix = sparse_matrix_formats[ sparse_matrix ]
+
+    return sparse_matrix( ( coef, (I, J) ), ( nb_row, nb_col ) )
+
+def FreeFem_file_to_vector( file_name ) :
+    '''
+    Reads a vector written by export_file_edp( 'vector' ).
+    '''
+
+    data = FreeFem_file_to_array( file_name )
+
+    return data[ 1 : 1 + int( data[0] ) ]
+
+def FreeFem_arrays_to_mesh( nodes, triangles, boundaries ) :
+    '''
+    Creates a TriMesh from FreeFem++ arrays:
+        nodes : [ x, y, label ]
+        triangles : [ node_1, node_2, node_3, label ]
+        boundaries : [ start_node, end_node, label ]
+    '''
+
+    FreeFem_mesh = dict( nodes = nodes, triangles = triangles, boundaries = boundaries )
 
     x, y, node_labels = FreeFem_mesh['nodes'].T
     node_labels = list( map( lambda x: int(x), node_labels ) )
@@ -150,11 +287,7 @@ def FreeFem_str_to_mesh( FreeFem_str ) :
     triangles = FreeFem_mesh['triangles'][:,:-1]
     triangle_labels = FreeFem_mesh['triangles'][:,-1]
 
-    boundary_edges = {}
-
-    for edge in FreeFem_mesh['boundaries'] :
-        # print(edge)
-        boundary_edges.update( FreeFem_edge_to_boundary_edge( edge, triangles ) )
+    boundary_edges = FreeFem_edges_to_boundary_edges( FreeFem_mesh['boundaries'], triangles )
 
     mesh = TriMesh(
         x, y,
@@ -167,6 +300,23 @@ def FreeFem_str_to_mesh( FreeFem_str ) :
     return mesh
 
 
+def FreeFem_edges_to_boundary_edges( FreeFem_edges, triangles, flip_reversed_edges = True ) :
+    '''
+    Vectorized version of FreeFem_edge_to_boundary_edge:
+    [ ( start_node, end_node, label_integer ), ... ] -> { ( triangle_index, triangle_node_index ) : label_integer, ... }
+
+    Returns a BoundaryEdges mapping.
+    '''
+
+    FreeFem_edges = np.asarray( FreeFem_edges, dtype = int ).reshape( ( -1, 3 ) )
+    start_nodes, end_nodes, labels = FreeFem_edges.T
+
+    triangle_indices, node_indices = DirectedEdgeIndex( triangles ).to_triangle_edges( start_nodes, end_nodes, flip_reversed_edges = flip_reversed_edges )
+
+    found = triangle_indices >= 0
+
+    return BoundaryEdges.from_arrays( triangle_indices[found], node_indices[found], labels[found] )
+
 def find_triangle_index( triangles, start_node, end_node ) :
 
     triangle_index = None
@@ -204,14 +354,46 @@ def FreeFem_edge_to_boundary_edge( FreeFem_edge, triangles, flip_reversed_edges
         node_index_in_triangle = triangles[triangle_index].tolist().index( start_node )
         return { ( triangle_index, node_index_in_triangle ) : label_integer  }
 
-def savevector( vector, file ) :
+def array_to_str( array, row_format ) :
+    '''
+    Formats a 2D array in a single pass, one row per line.
+
+    array_to_str( [ [ 1, 2.5 ], [ 3, 4.2 ] ], '%d %r' ) -> '1 2.5\n3 4.2\n'
+    '''
+
+    array = np.asarray( array )
+
+    return ( ( row_format + '\n' )*len( array ) ) % tuple( array.ravel().tolist() )
+
+def get_fingerprint( source ) :
+    '''
+    Hash of a mesh or a vector, to detect changes between runs.
+    '''
+
+    if isinstance( source, TriMesh ) :
+        return source.fingerprint()
+
+    source = np.ascontiguousarray( source )
+
+    return sha256( str( ( source.dtype, source.shape ) ).encode() + source.tobytes() ).hexdigest()
+
+def savevector( vector, file, header = False ) :
     '''
     Saves a vector (array) in FreeFem++ format in a .ffv file.
+
+    With header = True, the first line is the vector length, so that FreeFem++ can read the file with a single ">>" (see edpInput).
     '''
+
+    vector = np.asarray( vector, dtype = float ).reshape( ( -1, 1 ) ) # %r keeps full precision
+
     file.seek(0)
     file.truncate()
-    file.write( '\n'.join( [ str(value) for value in vector ] ) + '\n' )
-    
+
+    if header :
+        file.write( str( len( vector ) ) + '\n' )
+
+    file.write( array_to_str( vector, '%r' ) )
+
     return file.name
 
 def savemesh( mesh, file ) :
@@ -219,22 +401,21 @@ def savemesh( mesh, file ) :
     Saves mesh in FreeFem++ format in a .msh file.
     '''
 
+    boundary_edges = mesh.get_boundary_edge_array()
+
     mesh_str = ''
 
     # nv, nt, ne
-    mesh_str += array1D_to_str( [ len( mesh.x), len( mesh.triangles ), len( mesh.boundary_edges ) ] ) + '\n'
+    mesh_str += array1D_to_str( [ len( mesh.x), len( mesh.triangles ), len( boundary_edges ) ] ) + '\n'
 
     # vertices
-    for node_index in range( len( mesh.x ) ) :
-        mesh_str += array1D_to_str( [  mesh.x[node_index], mesh.y[node_index], mesh.node_labels[node_index] ] ) + '\n'
+    mesh_str += array_to_str( np.column_stack( ( mesh.x, mesh.y, mesh.node_labels ) ), '%r %r %d' )
 
     # triangles
-    for tri_index, triangle in enumerate( mesh.triangles ) :
-        mesh_str += array1D_to_str( np.array( triangle ) + 1 ) + ' ' + str( mesh.triangle_labels[tri_index] ) + '\n'
+    mesh_str += array_to_str( np.column_stack( ( mesh.triangles + 1, mesh.triangle_labels ) ), '%d %d %d %d' )
 
     # edges
-    for edge in mesh.get_boundary_edges() :
-        mesh_str += array1D_to_str( np.array( edge ) + np.array([ 1, 1, 0 ]) ) + '\n'
+    mesh_str += array_to_str( boundary_edges + np.array([ 1, 1, 0 ]), '%d %d %d' )
 
     file.seek(0)
     file.truncate()
@@ -276,9 +457,11 @@ def loadstr( data_str, delimiter = None, dtype = 'float', skip_rows = 0 ) :
     return np.array(data)
 
 
-def run_FreeFem( edp_str = None, verbose = False, stdin = None, platform = None ) :
+def run_FreeFem( edp_str = None, verbose = False, stdin = None, platform = None, stats = False ) :
     '''
     Run FreeFem++ on script edp_str, and returns Popen output.
+
+    With stats = True, returns ( output, RunStats ), with the run time, console size, CPU time and peak memory of FreeFem++.
     '''
 
     if stdin is None :
@@ -321,49 +504,195 @@ def run_FreeFem( edp_str = None, verbose = False, stdin = None, platform = None
     else :
         print('Unable to identify platform. Cannot run FreeFem++.')
 
-    with subprocess.Popen( **Popen_kwargs ) as proc :
+    run_stats = RunStats()
+    children_usage = get_children_usage()
+
+    with ResourcePopen( **Popen_kwargs ) as proc :
 
         if verbose :
             print('\nRunning FreeFem++...')
 
-        output, error = proc.communicate( input = input_to_stdin( stdin ).encode() ) # Freefem outputs errors in console
+        with run_stats.phase( 'run' ) :
+            output, error = proc.communicate( input = input_to_stdin( stdin ).encode() ) # Freefem outputs errors in console
 
         for temporary_file in temporary_files :
             temporary_file.close()
 
-        if not proc.returncode :
-            if verbose :
-                print('\nFreeFem++ ran successfully.\n')
-            return output.decode('utf-8')
+    run_stats.stdout_size = len( output )
+    run_stats.set_child_usage( proc.rusage, children_usage )
 
-        else :
+    output = FreeFem_output_to_str( proc.returncode, output, edp_str, print_error_message = print_error_message, verbose = verbose )
+
+    if stats :
+        return output, run_stats
+
+    return output
+
+def FreeFem_output_to_str( returncode, output, edp_str, print_error_message = True, verbose = False ) :
+    '''
+    Decode FreeFem++ output, and print error message if FreeFem++ failed.
+    '''
+
+    if not returncode :
+        if verbose :
+            print('\nFreeFem++ ran successfully.\n')
+        return output.decode('utf-8')
+
+    else :
+
+        if print_error_message :
+
+            print('\n-------------------')
+            print('FreeFem++ error :')
+            print('-------------------')
+            print( output.decode( 'utf-8' ) )
+            print('-------------------\n')
+            print('Corresponding line in FreeFem script:\n')
+            try :
+                print( get_edp_line( edp_str, parse_FreeFem_error_message( output.decode( 'utf-8' ) ) ) + '\n' )
+                print('(Use edpScript.pprint to display full script.)\n')
+            except :
+                print('Could not get corresponding line.\n')
 
-            if print_error_message :
 
+            if verbose :
                 print('\n-------------------')
-                print('FreeFem++ error :')
+                print('edp file :')
                 print('-------------------')
-                print( output.decode( 'utf-8' ) )
+                edp_pprint( edp_str )
                 print('-------------------\n')
-                print('Corresponding line in FreeFem script:\n')
-                try :
-                    print( get_edp_line( edp_str, parse_FreeFem_error_message( output.decode( 'utf-8' ) ) ) + '\n' )
-                    print('(Use edpScript.pprint to display full script.)\n')
-                except :
-                    print('Could not get corresponding line.\n')
 
+            return None
+
+        else :
+            return output.decode('utf-8')
+
+max_concurrent_FreeFem = cpu_count()
+FreeFem_semaphores = WeakKeyDictionary() # one per event loop
+
+def get_FreeFem_semaphore() :
+    '''
+    Default semaphore of the running event loop, which limits the number of simultaneous FreeFem++ processes to max_concurrent_FreeFem.
+    '''
+
+    loop = asyncio.get_running_loop()
+
+    if not loop in FreeFem_semaphores :
+        FreeFem_semaphores[loop] = asyncio.Semaphore( max_concurrent_FreeFem )
+
+    return FreeFem_semaphores[loop]
+
+async def run_FreeFem_async( edp_str, verbose = False, stdin = None, semaphore = None ) :
+    '''
+    Coroutine version of run_FreeFem: run FreeFem++ on script edp_str, and returns its output.
+
+    Arguments:
+        semaphore (asyncio.Semaphore) : limits the number of simultaneous runs. Defaults to get_FreeFem_semaphore().
+    '''
+
+    if stdin is None :
+        stdin = []
+
+    if semaphore is None :
+        semaphore = get_FreeFem_semaphore()
+
+    async with semaphore :
+
+        with NamedTemporaryFile( suffix = '.edp', mode = 'w', buffering = 1, dir = memory_tempfile_dir ) as edp_temp_file :
+
+            edp_temp_file.write( edp_str )
+
+            proc = await asyncio.create_subprocess_exec( 'FreeFem++', '-v', '0', edp_temp_file.name, stdin = subprocess.PIPE, stdout = subprocess.PIPE, stderr = subprocess.PIPE )
+
+            if verbose :
+                print('\nRunning FreeFem++...')
+
+            output, error = await proc.communicate( input = input_to_stdin( stdin ).encode() )
+
+    return FreeFem_output_to_str( proc.returncode, output, edp_str, verbose = verbose )
+
+def stream_FreeFem( edp_str, verbose = False, stdin = None, error_lines = 100, flags = () ) :
+    '''
+    Run FreeFem++ on script edp_str, and yield its flagged outputs as soon as FreeFem++ prints them.
+
+    for flag, output_str in stream_FreeFem( edp_str ) :
+        ...
+
+    output_str is the text between a pair of flag lines (outputs nested in another one are yielded too).
+    Only the output being printed is kept in memory. Closing the generator kills FreeFem++.
+
+    Arguments:
+        error_lines (int) : number of unflagged lines kept to print the error message, if FreeFem++ fails
+        flags : custom flags, recognized besides the standard ones ( '# FLAG > ...' )
+    '''
+
+    if stdin is None :
+        stdin = []
+
+    flag_start = flagize( '' )
+    custom_flags = set( flags )
+
+    with NamedTemporaryFile( suffix = '.edp', mode = 'w', buffering = 1, dir = memory_tempfile_dir ) as edp_temp_file :
 
-                if verbose :
-                    print('\n-------------------')
-                    print('edp file :')
-                    print('-------------------')
-                    edp_pprint( edp_str )
-                    print('-------------------\n')
+        edp_temp_file.write( edp_str )
+
+        proc = subprocess.Popen( [ 'FreeFem++', '-v', '0', edp_temp_file.name ], stdin = subprocess.PIPE, stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True )
+
+        if verbose :
+            print('\nRunning FreeFem++...')
+
+        try :
+            try :
+                proc.stdin.write( input_to_stdin( stdin ) )
+                proc.stdin.close()
+            except BrokenPipeError : # FreeFem++ failed before reading stdin
+                pass
+
+            lines = [] # since the first open flag
+            open_flags = {} # flag : position of its first line in lines
+            unflagged_lines = deque( maxlen = error_lines )
+
+            for line in proc.stdout :
+
+                flag = line.rstrip('\r\n')
+
+                if not ( flag.startswith( flag_start ) or flag in custom_flags ) :
+
+                    if len( open_flags ) > 0 :
+                        lines += [ line ]
+                    else :
+                        unflagged_lines += [ line ]
+
+                elif flag in open_flags : # closing flag
+
+                    yield flag, ''.join( lines[ open_flags.pop( flag ): ] )
+
+                    if len( open_flags ) == 0 :
+                        lines = []
+                    else :
+                        lines += [ line ]
+
+                else : # opening flag
+
+                    if len( open_flags ) > 0 :
+                        lines += [ line ]
+
+                    open_flags[flag] = len( lines )
+
+            proc.wait()
+
+            if proc.returncode :
+                FreeFem_output_to_str( proc.returncode, ''.join( unflagged_lines ).encode(), edp_str, verbose = verbose )
+
+            elif verbose :
+                print('\nFreeFem++ ran successfully.\n')
 
-                return None
+        finally :
+            if proc.poll() is None : # the generator was closed early
+                proc.kill()
 
-            else :
-                return output.decode('utf-8')
+            proc.stdout.close()
+            proc.wait()
 
 def parse_FreeFem_version( version ) :
 
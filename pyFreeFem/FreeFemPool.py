@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Olivier Devauchelle
+#
+# Many thanks to Eric Lajeunesse, Anaïs Abramian, Valentin Jules & Hugo Chauvet.
+#
+# When used in a scientific publication, please cite:
+#
+# Boltzmann Distribution of Sediment Transport, A. Abramian, O. Devauchelle,
+# G. Seizilles, E. Lajeunesse, Physical Review Letters, 123, 014501, 2019
+
+import os
+import subprocess
+import threading
+from queue import Queue, Empty
+
+from .FreeFemIO import FreeFem_output_to_str, local_platform
+from .FreeFemTools.edpTools import input_to_stdin
+
+class FreeFemWorker :
+    '''
+    A FreeFem++ process started in advance, which waits for its script on a pipe.
+    '''
+
+    def __init__( self, FreeFem_command = 'FreeFem++', preamble = '' ) :
+
+        self.preamble = preamble
+
+        script_pipe, self.script_writer = os.pipe()
+
+        self.proc = subprocess.Popen(
+            args = [ FreeFem_command, '-v', '0', '/dev/fd/' + str( script_pipe ) ],
+            stdin = subprocess.PIPE, stdout = subprocess.PIPE, stderr = subprocess.PIPE,
+            pass_fds = [ script_pipe ]
+            )
+
+        os.close( script_pipe ) # the child keeps its own copy
+
+        self.writer_thread = self.write_in_background( preamble, close = False )
+
+    def write_in_background( self, edp_str, close = True ) :
+        '''
+        Write into the script pipe without blocking, since FreeFem++ may fill its stdout before reading the whole script.
+        '''
+
+        def write() :
+            try :
+                self.write_all( edp_str.encode() )
+            except OSError : # FreeFem++ died
+                pass
+
+            if close :
+                os.close( self.script_writer )
+
+        writer_thread = threading.Thread( target = write, daemon = True )
+        writer_thread.start()
+
+        return writer_thread
+
+    def write_all( self, edp_bytes ) :
+
+        while len( edp_bytes ) > 0 :
+            edp_bytes = edp_bytes[ os.write( self.script_writer, edp_bytes ): ]
+
+    def run( self, edp_str, verbose = False, stdin = None ) :
+        '''
+        Send script edp_str to FreeFem++, and returns its output. A worker can only run once.
+        '''
+
+        if stdin is None :
+            stdin = []
+
+        self.writer_thread.join() # preamble first
+        self.writer_thread = self.write_in_background( edp_str )
+
+        if verbose :
+            print('\nRunning FreeFem++...')
+
+        output, error = self.proc.communicate( input = input_to_stdin( stdin ).encode() )
+
+        self.writer_thread.join()
+
+        return FreeFem_output_to_str( self.proc.returncode, output, self.preamble + edp_str, verbose = verbose )
+
+    def kill( self ) :
+
+        self.proc.kill()
+        self.proc.communicate()
+
+        self.writer_thread.join()
+
+        try :
+            os.close( self.script_writer )
+        except OSError :
+            pass
+
+
+class FreeFemPool :
+    '''
+    A pool of FreeFem++ processes started in advance.
+
+    FreeFem++ cannot load a new script once it is running, so each worker runs one script only.
+    Workers are replaced as soon as they are used, so that process start-up (and the preamble)
+    is paid in the background.
+
+    pool = FreeFemPool( size = 2, preamble = '' )
+    script.get_output( backend = pool )
+    '''
+
+    def __init__( self, size = 2, preamble = '', FreeFem_command = 'FreeFem++' ) :
+
+        '''
+        Arguments:
+            size (int) : number of idle FreeFem++ processes
+            preamble (str) : edp code run by each worker before receiving its script (e.g. load "msh3")
+            FreeFem_command (str) : FreeFem++ executable
+        '''
+
+        if local_platform not in [ 'Linux', 'Darwin' ] :
+            raise OSError( 'FreeFemPool requires Linux or MacOS.' )
+
+        self.size = size
+        self.preamble = preamble
+        self.FreeFem_command = FreeFem_command
+
+        self.workers = Queue()
+
+        for _ in range( size ) :
+            self.add_worker()
+
+    def add_worker( self ) :
+        self.workers.put( FreeFemWorker( FreeFem_command = self.FreeFem_command, preamble = self.preamble ) )
+
+    def run( self, edp_str, verbose = False, stdin = None ) :
+        '''
+        Run FreeFem++ on script edp_str in an idle worker, and returns its output, like run_FreeFem.
+        '''
+
+        worker = self.workers.get()
+        self.add_worker() # replacement starts while this one runs
+
+        return worker.run( edp_str, verbose = verbose, stdin = stdin )
+
+    def close( self ) :
+        '''
+        Kill idle workers.
+        '''
+
+        while True :
+            try :
+                self.workers.get_nowait().kill()
+            except Empty :
+                break
+
+    def __enter__( self ) :
+        return self
+
+    def __exit__( self, *args ) :
+        self.close()
@@ -151,3 +151,71 @@ def export_vector_edp( **kwargs ) :
         edp_str = edp_str.replace( *name )
 
     return edp_str
+
+###################################
+#
+# EXPORT TO FILE
+#
+###################################
+
+# Full-precision, whitespace-separated numbers, to be read with numpy.fromfile
+
+export_file_header = '''
+ofstream OutputFile( "_file_name_" );
+OutputFile.precision( 17 );
+'''
+
+export_file_templates = {
+
+    'mesh' : export_file_header + '''
+OutputFile << _Th_.nv << " " << _Th_.nt << " " << _Th_.nbe << endl;
+
+for (int nv = 0; nv < _Th_.nv; nv++ )
+	{
+	OutputFile << _Th_(nv).x << " " << _Th_(nv).y << " " << _Th_(nv).label << endl;
+	}
+
+for (int nt = 0; nt < _Th_.nt; nt++ )
+	{
+	OutputFile << _Th_[nt][0] << " " << _Th_[nt][1] << " " << _Th_[nt][2] << " " << _Th_[nt].label << endl;
+	}
+
+for (int ne = 0; ne < _Th_.nbe; ne++ )
+	{
+	OutputFile << _Th_.be(ne)[0] << " " << _Th_.be(ne)[1] << " " << _Th_.be(ne).label << endl;
+	}
+''',
+
+    'matrix' : '''
+int[int] OutputI(1), OutputJ(1);
+real[int] OutputCoef(1);
+[ OutputI, OutputJ, OutputCoef ] = M_matrix_name_;
+''' + export_file_header + '''
+OutputFile << M_matrix_name_.n << " " << M_matrix_name_.m << endl;
+OutputFile << OutputI << endl << OutputJ << endl << OutputCoef << endl;
+''',
+
+    'vector' : export_file_header + '''
+OutputFile << _u_[] << endl;
+''',
+
+    'real' : export_file_header + '''
+OutputFile << _number_name_ << endl;
+''',
+
+    'int' : export_file_header + '''
+OutputFile << _number_name_ << endl;
+''',
+    }
+
+def export_file_edp( data_type, **kwargs ) :
+    '''
+    edp code which writes a FreeFem++ variable into a file. The code is enclosed in braces.
+    '''
+
+    edp_str = '{' + export_file_templates[ data_type ] + '}\n'
+
+    for name in kwargs.items() :
+        edp_str = edp_str.replace( *name )
+
+    return edp_str
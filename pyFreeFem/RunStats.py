@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Olivier Devauchelle
+#
+# Many thanks to Eric Lajeunesse, Anaïs Abramian, Valentin Jules & Hugo Chauvet.
+#
+# When used in a scientific publication, please cite:
+#
+# Boltzmann Distribution of Sediment Transport, A. Abramian, O. Devauchelle,
+# G. Seizilles, E. Lajeunesse, Physical Review Letters, 123, 014501, 2019
+
+
+import os
+import subprocess
+from time import perf_counter
+from contextlib import contextmanager
+from platform import system
+
+try :
+    import resource
+except ImportError : # Windows
+    resource = None
+
+# ru_maxrss is in kilobytes, except on MacOS
+maxrss_unit = 1 if system() == 'Darwin' else 1024
+
+class RunStats :
+    '''
+    Timings and resources of a script run.
+
+    output, stats = script.get_output( stats = True )
+    print( stats )
+
+    Attributes:
+        phases (dict) : wall time of each phase, in seconds: 'edp' (script generation), 'save' (input files),
+            'cache' (key and lookup), 'run' (FreeFem++), 'parse'
+        temp_bytes_written (int) : bytes written into temporary input files
+        temp_bytes_read (int) : bytes read from temporary output files
+        stdout_size (int) : size of the FreeFem++ console output, in bytes
+        cpu_time (float) : user and system CPU time of FreeFem++, in seconds (None if unknown)
+        max_rss (int) : peak resident memory of FreeFem++, in bytes (None if unknown). On Linux, it is at least that
+            of the Python process at the time FreeFem++ was started, since the peak is inherited through fork.
+        block_times (list) : ( block name, seconds ) measured by FreeFem++ itself, with clock()
+        cache_hit (bool) : whether FreeFem++ was skipped
+    '''
+
+    def __init__( self, name = None ) :
+
+        self.name = name
+        self.phases = {}
+
+        self.temp_bytes_written = 0
+        self.temp_bytes_read = 0
+        self.stdout_size = 0
+
+        self.cpu_time = None
+        self.max_rss = None
+
+        self.block_times = []
+        self.cache_hit = False
+
+    @contextmanager
+    def phase( self, name ) :
+        '''
+        with stats.phase( 'parse' ) :
+            ...
+        '''
+
+        start = perf_counter()
+
+        try :
+            yield self
+        finally :
+            self.phases[name] = self.phases.get( name, 0. ) + perf_counter() - start
+
+    def get_total_time( self ) :
+        return sum( self.phases.values() )
+
+    def update( self, other ) :
+        '''
+        Add the measurements of another RunStats (e.g. that of run_FreeFem).
+        '''
+
+        for name, duration in other.phases.items() :
+            self.phases[name] = self.phases.get( name, 0. ) + duration
+
+        self.temp_bytes_written += other.temp_bytes_written
+        self.temp_bytes_read += other.temp_bytes_read
+        self.stdout_size += other.stdout_size
+
+        if not other.cpu_time is None :
+            self.cpu_time = ( self.cpu_time or 0. ) + other.cpu_time
+
+        if not other.max_rss is None :
+            self.max_rss = max( self.max_rss or 0, other.max_rss )
+
+        self.block_times += other.block_times
+
+    def set_child_usage( self, rusage = None, children_before = None ) :
+        '''
+        Arguments:
+            rusage : resource usage of the FreeFem++ process, from os.wait4
+            children_before : resource.getrusage( RUSAGE_CHILDREN ) before the run, used if rusage is None. Then, max_rss is the peak of all the children of this process.
+        '''
+
+        if rusage is None and not children_before is None :
+
+            children_after = resource.getrusage( resource.RUSAGE_CHILDREN )
+
+            self.cpu_time = ( children_after.ru_utime - children_before.ru_utime ) + ( children_after.ru_stime - children_before.ru_stime )
+            self.max_rss = children_after.ru_maxrss*maxrss_unit
+
+        elif not rusage is None :
+            self.cpu_time = rusage.ru_utime + rusage.ru_stime
+            self.max_rss = rusage.ru_maxrss*maxrss_unit
+
+    def to_dict( self ) :
+
+        return dict(
+            name = self.name,
+            phases = self.phases.copy(),
+            total_time = self.get_total_time(),
+            temp_bytes_written = self.temp_bytes_written,
+            temp_bytes_read = self.temp_bytes_read,
+            stdout_size = self.stdout_size,
+            cpu_time = self.cpu_time,
+            max_rss = self.max_rss,
+            block_times = list( self.block_times ),
+            cache_hit = self.cache_hit,
+            )
+
+    def __repr__( self ) :
+
+        lines = [ 'RunStats' + ( '' if self.name is None else ' ' + self.name ) + ' (%.3g s)' % self.get_total_time() ]
+        lines += [ '    %-6s %.3g s' % item for item in self.phases.items() ]
+        lines += [ '    temporary files: %d bytes written, %d bytes read' % ( self.temp_bytes_written, self.temp_bytes_read ) ]
+        lines += [ '    FreeFem++ console: %d bytes' % self.stdout_size ]
+
+        if not self.cpu_time is None :
+            lines += [ '    FreeFem++ CPU time: %.3g s, peak memory: %.3g MB' % ( self.cpu_time, self.max_rss/1e6 ) ]
+
+        if self.cache_hit :
+            lines += [ '    cache hit' ]
+
+        for name, duration in self.block_times :
+            lines += [ '    block %s: %.3g s' % ( name, duration ) ]
+
+        return '\n'.join( lines )
+
+def get_children_usage() :
+    '''
+    Resource usage of the terminated children of this process, or None if unavailable.
+    '''
+
+    if resource is None :
+        return None
+
+    return resource.getrusage( resource.RUSAGE_CHILDREN )
+
+class ResourcePopen( subprocess.Popen ) :
+    '''
+    Popen which records the resource usage of the child process (rusage attribute, None if unavailable), using os.wait4.
+    '''
+
+    rusage = None
+
+    def _try_wait( self, wait_flags ) :
+
+        if not hasattr( os, 'wait4' ) :
+            return super()._try_wait( wait_flags )
+
+        try :
+            pid, status, rusage = os.wait4( self.pid, wait_flags )
+
+        except ChildProcessError : # as in subprocess, the child is dead, and its status lost
+            return self.pid, 0
+
+        if pid == self.pid :
+            self.rusage = rusage
+
+        return pid, status
+
+###################################
+#
+# HOOKS
+#
+###################################
+
+run_stats_hooks = []
+
+def add_run_stats_hook( hook ) :
+    '''
+    Call hook( stats ) after each run of edpScript.get_output, where stats is a RunStats. Can be used as a decorator.
+
+    @pyff.add_run_stats_hook
+    def log( stats ) :
+        my_metrics.record( stats.to_dict() )
+    '''
+
+    run_stats_hooks.append( hook )
+
+    return hook
+
+def remove_run_stats_hook( hook ) :
+    run_stats_hooks.remove( hook )
+
+def call_run_stats_hooks( stats ) :
+
+    for hook in list( run_stats_hooks ) :
+        hook( stats )
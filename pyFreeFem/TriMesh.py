@@ -25,17 +25,21 @@
 
 
 import matplotlib.tri as mptri
-from pylab import gca, mean, array, nan, arange
+from pylab import gca, mean, array, nan, arange, concatenate
+from numpy import ascontiguousarray, column_stack, empty, unique, argsort, allclose
+from hashlib import sha256
 
 if __name__ == '__main__' :
     from meshTools.segments import *
     from meshTools.export_to_json import export_to_json
-    from meshTools.polygon_triangulate import polygon_triangulate
+    from meshTools.boundary_edges import BoundaryEdges
+    from meshTools.triangulate import triangulate_polygon, signed_area
 
 else :
     from .meshTools.segments import *
     from .meshTools.export_to_json import export_to_json
-    from .meshTools.polygon_triangulate import polygon_triangulate
+    from .meshTools.boundary_edges import BoundaryEdges
+    from .meshTools.triangulate import triangulate_polygon, signed_area
 
 TriMesh_structure ='''
 TriMesh attributes:
@@ -45,7 +49,7 @@ TriMesh attributes:
     - Nodes labels (list)
     - Triangle labels (list)
 
-    - Oriented edges with labels (dict)
+    - Oriented edges with labels (BoundaryEdges, a dict-like mapping backed by arrays)
 
         - Triangle index
         - Node index (0,1 or 2)
@@ -101,16 +105,18 @@ class TriMesh( mptri.Triangulation ) :
 
 
         self.triangle_labels = triangle_labels
+        self._fingerprint = None
+        self._P1_assembler = None
+        self._edge_index = None
+        self._boundary_cache = {}
         self.boundary_edges = {}
 
         if not boundary_edge_labels is None : # assumes boundary_edges is in the form [ [start_node, end_node], ... ]
-            
-            boundary_edges_with_label = {}
 
-            for i, edge in enumerate( boundary_edges ) :
-                 boundary_edges_with_label[ edge_nodes_to_triangle_edge( edge, self.triangles) ] = boundary_edge_labels[i]
-            
-            boundary_edges = boundary_edges_with_label
+            triangle_indices, nodes_in_triangle = self.node_edges_to_triangle_edges( boundary_edges )
+            found = triangle_indices >= 0
+
+            boundary_edges = BoundaryEdges.from_arrays( triangle_indices[found], nodes_in_triangle[found], [ label for label, is_found in zip( boundary_edge_labels, found ) if is_found ] )
 
 
         if not boundary_edges is None :
@@ -118,6 +124,113 @@ class TriMesh( mptri.Triangulation ) :
 
 
 
+    def invalidate( self ) :
+        '''
+        Forget what was computed from the mesh. Must be called after changing the mesh in place (e.g. Th.x[0] = 1.).
+        '''
+        self._P1_assembler = None
+        self._edge_index = None
+        self.invalidate_boundaries()
+
+    def invalidate_boundaries( self ) :
+        '''
+        Forget what was computed from the boundary edges. Called automatically when boundary_edges is modified.
+        '''
+        self._fingerprint = None
+        self._boundary_cache.clear()
+
+    @property
+    def boundary_edges( self ) :
+        '''
+        { ( triangle_index, node_in_triangle ) : label }
+        '''
+        return self._boundary_edges
+
+    @boundary_edges.setter
+    def boundary_edges( self, boundary_edges ) :
+        self._boundary_edges = BoundaryEdges( boundary_edges, on_change = self.invalidate_boundaries )
+        self.invalidate_boundaries()
+
+    def fingerprint( self ) :
+        '''
+        Hash of the mesh content, computed once until the mesh is invalidated.
+        '''
+
+        if self._fingerprint is None :
+
+            content = sha256()
+
+            for array_like in [ self.x, self.y, self.triangles, self.node_labels, self.triangle_labels ] :
+                content.update( ascontiguousarray( array_like ).tobytes() )
+
+            content.update( ascontiguousarray( self.get_boundary_edge_array( label_type = 'int', index_type = 'triangle' ) ).tobytes() )
+
+            _, int_to_label = self.get_boundary_label_conversion()
+            content.update( repr( sorted( int_to_label.items() ) ).encode() )
+
+            self._fingerprint = content.hexdigest()
+
+        return self._fingerprint
+
+    def get_P1_assembler( self ) :
+        '''
+        P1Assembler of the mesh, created once until the mesh is invalidated.
+
+        K = Th.get_P1_assembler().stiffness( D )
+        '''
+
+        if self._P1_assembler is None :
+            from .nativeAssembly import P1Assembler
+            self._P1_assembler = P1Assembler( self )
+
+        return self._P1_assembler
+
+    def get_edge_index( self ) :
+        '''
+        DirectedEdgeIndex of the triangles, created once until the mesh is invalidated.
+        '''
+
+        if self._edge_index is None :
+            self._edge_index = DirectedEdgeIndex( self.triangles, nb_nodes = len( self.x ) )
+
+        return self._edge_index
+
+    def locate_edges( self, start_nodes, end_nodes ) :
+        '''
+        triangle_indices, nodes_in_triangle = Th.locate_edges( start_nodes, end_nodes )
+
+        Triangle which contains each directed edge, and position of the start node in this triangle (-1 if not found).
+        '''
+        return self.get_edge_index().locate( start_nodes, end_nodes )
+
+    def get_edge_triangles( self, start_nodes, end_nodes ) :
+        '''
+        left_triangles, right_triangles = Th.get_edge_triangles( start_nodes, end_nodes )
+
+        Triangles on the left and right sides of each directed edge (-1 if none).
+        '''
+        return self.get_edge_index().get_adjacent_triangles( start_nodes, end_nodes )
+
+    def get_outline( self ) :
+        '''
+        Edges of the mesh outline, labelled or not, as [ [ start_node, end_node ], ... ].
+        '''
+
+        triangle_indices, nodes_in_triangle = self.get_edge_index().get_boundary()
+
+        return column_stack( [ self.triangles[ triangle_indices, nodes_in_triangle ], self.triangles[ triangle_indices, ( nodes_in_triangle + 1 ) % 3 ] ] )
+
+    def node_edges_to_triangle_edges( self, edges, flip_reversed_edges = True ) :
+        '''
+        triangle_indices, nodes_in_triangle = Th.node_edges_to_triangle_edges( [ [ start_node, end_node ], ... ] )
+
+        Edges which are not found are reversed, with a warning. The remaining ones are -1.
+        '''
+
+        edges = array( edges, dtype = int ).reshape( ( -1, 2 ) )
+
+        return self.get_edge_index().to_triangle_edges( edges[:,0], edges[:,1], flip_reversed_edges = flip_reversed_edges )
+
     def add_boundary_edges( self, boundary_edges, label = None ) :
         '''
         Add a boundary.
@@ -143,7 +256,9 @@ class TriMesh( mptri.Triangulation ) :
                 try :
                     # assume [ [i,j], [k,l], ... ] where i, j, k, l are node node_indices
                     boundary_edges[0][1] # check format;
-                    self.add_boundary_edges( node_index_to_triangle_index_edges( boundary_edges, self.triangles, label = label ) )
+                    triangle_indices, nodes_in_triangle = self.node_edges_to_triangle_edges( boundary_edges )
+                    found = triangle_indices >= 0
+                    self.boundary_edges.update_arrays( triangle_indices[found], nodes_in_triangle[found], label )
 
                 except :
                     # assume [ first_node, second_node, ... ]
@@ -153,50 +268,80 @@ class TriMesh( mptri.Triangulation ) :
 
 
     def get_boundary_label_conversion( self ) :
-        return label_conversion( list( self.boundary_edges.values() ) )
+        '''
+        label_to_int, int_to_label = Th.get_boundary_label_conversion()
+        '''
+
+        if not 'label_conversion' in self._boundary_cache :
+            self._boundary_cache['label_conversion'] = label_conversion( self.boundary_edges.get_used_labels() )
+
+        label_to_int, int_to_label = self._boundary_cache['label_conversion']
+
+        return label_to_int.copy(), int_to_label.copy()
 
     def rename_boundary( self, new_names, verbose = False ) :
 
-        for edge in self.boundary_edges.keys() :
+        renamed_edges = {}
+
+        for edge, label in self.boundary_edges.items() :
             try :
-                self.boundary_edges[edge] = new_names[ self.boundary_edges[edge] ]
+                renamed_edges[edge] = new_names[ label ]
             except :
                 if verbose :
-                    print( 'No new name for ' + str( self.boundary_edges[edge] ) )
+                    print( 'No new name for ' + str( label ) )
                 pass
 
-    def get_boundary_edges( self, label_type = 'int', index_type = 'node' ) :
+        self.boundary_edges.update( renamed_edges )
 
-        '''
-        Method to convert boundary segments into an array.
+    def get_boundary_edge_array( self, label_type = 'int', index_type = 'node' ) :
 
-        Typically:
-        { ( triangle_index, node_index_in_triangle ) : raw_label }
-            -> [ start_node_index, end_node_index, int_label ]
+        '''
+        Same as get_boundary_edges, as a read-only numpy array, computed once until the boundaries change.
         '''
 
-        if label_type == 'int' :
-            label_to_int, _ = self.get_boundary_label_conversion()
+        key = ( 'edge_array', label_type, index_type )
 
-        edges = []
+        if not key in self._boundary_cache :
 
-        for edge in self.boundary_edges.keys() :
+            triangle_index, node_in_triangle, label_codes = self.boundary_edges.get_arrays()
 
             if index_type == 'node' :
-                edge_indices = list( triangle_edge_to_node_edge( edge, self.triangles ) )
+                edge_indices = column_stack( [ self.triangles[ triangle_index, node_in_triangle ], self.triangles[ triangle_index, ( node_in_triangle + 1 ) % 3 ] ] ).astype( int )
 
             elif index_type == 'triangle' :
-                edge_indices = list( edge )
+                edge_indices = column_stack( [ triangle_index, node_in_triangle ] ).astype( int )
+
+            label_table = self.boundary_edges.label_table
 
             if label_type == 'int' :
-                label = label_to_int[ self.boundary_edges[ edge ] ]
+                label_to_int, _ = self.get_boundary_label_conversion()
+                code_to_int = array( [ label_to_int.get( label, 0 ) for label in label_table ] + [ 0 ], dtype = int ) # unused labels are not converted
+                edges = column_stack( [ edge_indices, code_to_int[ label_codes ] ] )
 
             else :
-                label = self.boundary_edges[ edge ]
+                code_to_label = empty( len( label_table ), dtype = object )
+                code_to_label[:] = label_table
+                edges = empty( ( len( label_codes ), 3 ), dtype = object )
+                edges[:,:2] = edge_indices
+                edges[:,2] = code_to_label[ label_codes ]
 
-            edges += [ edge_indices + [ label ] ]
+            edges.flags.writeable = False
 
-        return edges
+            self._boundary_cache[key] = edges
+
+        return self._boundary_cache[key]
+
+    def get_boundary_edges( self, label_type = 'int', index_type = 'node' ) :
+
+        '''
+        Method to convert boundary segments into an array.
+
+        Typically:
+        { ( triangle_index, node_index_in_triangle ) : raw_label }
+            -> [ start_node_index, end_node_index, int_label ]
+        '''
+
+        return self.get_boundary_edge_array( label_type = label_type, index_type = index_type ).tolist()
 
     def get_boundaries( self ) :
 
@@ -206,26 +351,27 @@ class TriMesh( mptri.Triangulation ) :
         Each segment is an oriented list of nodes
         '''
 
-        boundaries = {}
+        if not 'boundaries' in self._boundary_cache :
 
-        for edge in self.get_boundary_edges( label_type = 'raw' ) :
+            boundaries = {}
 
-            label = edge[-1]
+            node_edges = self.get_boundary_edge_array( label_type = 'int' )[:,:2]
+            label_codes = self.boundary_edges.get_arrays()[2]
 
-            try :
-                edges = boundaries[label]
-            except :
-                edges = []
+            # labels in order of first appearance
+            codes, first_edges = unique( label_codes, return_index = True )
 
-            edges += [ edge[:-1] ] # each edge is properly oriented, but edges are not sorted at this point
+            for code in codes[ argsort( first_edges ) ] :
 
-            boundaries.update( { label : edges } )
+                label = self.boundary_edges.label_table[code]
 
-        for label in boundaries.keys() :
+                # each edge is properly oriented, but edges are not sorted at this point
+                boundaries[label] = edges_to_segments( node_edges[ label_codes == code ].tolist() )
 
-            boundaries[label] = edges_to_segments(  boundaries[label] )
+            self._boundary_cache['boundaries'] = boundaries
 
-        return boundaries
+        # copies, since the cached boundaries must not be modified
+        return { label : [ segment.copy() for segment in segments ] for label, segments in self._boundary_cache['boundaries'].items() }
 
 
     def plot_triangles( self, labels = None, ax = None, **kwargs ) :
@@ -280,8 +426,10 @@ class TriMesh( mptri.Triangulation ) :
         if ax is None :
             ax = gca()
 
+        boundaries = self.get_boundaries()
+
         if labels is None :
-            labels = self.get_boundaries().keys()
+            labels = boundaries.keys()
 
         try:
             enumerate(labels)
@@ -290,7 +438,7 @@ class TriMesh( mptri.Triangulation ) :
 
         for label in labels :
 
-            segments = self.get_boundaries()[label]
+            segments = boundaries[label]
 
             boundary_kwargs = { 'label' : label }
             boundary_kwargs.update( kwargs )
@@ -310,18 +458,25 @@ class TriMesh( mptri.Triangulation ) :
         if ax is None :
             ax = gca()
 
-        for edge in self.boundary_edges.keys() :
+        edges = self.get_boundary_edge_array( label_type = 'raw' )
+        node_indices = edges[:,:2].astype( int )
+
+        # all edges in one line, separated by nans
+        x, y = [ column_stack( [ coordinate[node_indices], [ nan ]*len( edges ) ] ).ravel() for coordinate in ( self.x, self.y ) ]
 
-            node_indices = list( triangle_edge_to_node_edge( edge, self.triangles ) )
+        edge_plot = ax.plot( x, y, **kwargs )
 
-            x, y = self.x[node_indices], self.y[node_indices]
+        if labels == 'label' :
 
-            edge_plot = ax.plot( x, y, **kwargs )
+            label_style = dict(va = 'center', ha = 'center', color = edge_plot[0].get_color() )
+            x, y = [ coordinate[node_indices].mean( axis = 1 ) for coordinate in ( self.x, self.y ) ]
 
-            if labels == 'label' :
-                label_style = dict(va = 'center', ha = 'center', color = edge_plot[0].get_color() )
-                ax.plot( mean(x), mean(y), 'ow', ms = 12 )
-                ax.text( mean(x), mean(y), self.boundary_edges[edge], **label_style )
+            ax.plot( x, y, 'ow', ms = 12 )
+
+            for i, label in enumerate( edges[:,2] ) :
+                ax.text( x[i], y[i], label, **label_style )
+
+        return edge_plot
 
     # def adaptmesh( self, *args, **kwargs ) : # import standalone module...
     #
@@ -330,46 +485,93 @@ class TriMesh( mptri.Triangulation ) :
     def to_json( self, **kwargs ) :
         return export_to_json( self, **kwargs )
 
-def TriMesh_from_polygon( points, label = None ) :
+def TriMesh_from_polygon( points, label = None, holes = None, closed = False ) :
     '''
-    Creates a mesh from a polygon boundary.
-    Based on polygon_triangulate by John Burkardt (https://people.sc.fsu.edu/~jburkardt/py_src/polygon_triangulate/polygon_triangulate.html).
-    This function cannot handle holes.
+    Creates a mesh from a polygon boundary, by ear clipping (see meshTools.triangulate).
 
-    mesh = TriMesh_from_polygon( points, label = None )
+    mesh = TriMesh_from_polygon( points, label = None, holes = None, closed = False )
 
+    Arguments:
+        points : counterclockwise list of points [ x, y ]
+        label : label of the boundary edges ('auto' to invent one, None for no boundary edges)
+        holes : list of holes, each a list of points. The nodes of the holes follow those of the polygon.
+        closed : if True, the edge from the last point to the first one is a boundary edge too. The boundaries of holes are always closed.
     '''
 
-    the_mesh = TriMesh( *array( points ).T, triangles = polygon_triangulate( len( points ), *array( points ).T ) )
+    if holes is None :
+        holes = []
+
+    holes = [ array( hole ) for hole in holes ]
+
+    x, y = array( points ).T
+
+    the_mesh = TriMesh(
+        concatenate( [ x ] + [ hole[:,0] for hole in holes ] ),
+        concatenate( [ y ] + [ hole[:,1] for hole in holes ] ),
+        triangles = triangulate_polygon( x, y, holes = [ hole.T for hole in holes ] )
+        )
 
     if not label is None :
 
-        if label == 'auto' :
-            the_mesh.add_boundary_edges( arange( len( points ) ) )
+        for nodes in get_polygon_boundaries( points, holes, closed = closed ) :
+
+            if label == 'auto' :
+                the_mesh.add_boundary_edges( nodes )
 
-        else :
-            the_mesh.add_boundary_edges( arange( len( points ) ), label = label )
+            else :
+                the_mesh.add_boundary_edges( nodes, label = label )
 
     return the_mesh
 
+def get_polygon_boundaries( points, holes, closed = True ) :
+    '''
+    Lists of nodes along the polygon and its holes, with the domain on their left. The boundaries of the holes are closed, that of the polygon only if closed is True.
+    '''
+
+    boundaries = [ list( range( len( points ) ) ) + [ 0 ]*closed ]
+    first_node = len( points )
+
+    for hole in holes :
+
+        nodes = list( range( first_node, first_node + len( hole ) ) )
+
+        if signed_area( *hole.T ) > 0 :
+            nodes = nodes[::-1]
 
-def TriMesh_from_boundaries( boundaries, labels = None ) :
+        boundaries += [ nodes + nodes[:1] ]
+        first_node += len( hole )
+
+    return boundaries
+
+
+def TriMesh_from_boundaries( boundaries, labels = None, holes = None, hole_labels = None ) :
     '''
     Creates a mesh from a list of boundaries, each a list of points. The boundaries are counterclockwise ordered.
 
-    mesh = TriMesh_from_boundaries( boundaries, labels = None )
+    mesh = TriMesh_from_boundaries( boundaries, labels = None, holes = None, hole_labels = None )
+
+    Holes are lists of points (closed or not, in any orientation), labelled by hole_labels.
     '''
 
     if labels is None :
         labels = [None]*len(boundaries)
 
+    if holes is None :
+        holes = []
+
+    if hole_labels is None :
+        hole_labels = [None]*len(holes)
+
     all_points = []
     point_indices = [ 0, 0 ]
 
     for boundary in boundaries :
         all_points += list( boundary[:-1] )
 
-    the_mesh = TriMesh_from_polygon( all_points )
+    holes = [ array( hole, dtype = float ) for hole in holes ]
+    holes = [ hole[:-1] if is_closed( hole ) else hole for hole in holes ]
+
+    the_mesh = TriMesh_from_polygon( all_points, holes = holes )
 
     for i, boundary in enumerate( boundaries ) :
 
@@ -384,9 +586,21 @@ def TriMesh_from_boundaries( boundaries, labels = None ) :
 
         point_indices[0] = point_indices[1]
 
+    for nodes, label in zip( get_polygon_boundaries( all_points, holes )[1:], hole_labels ) :
+        the_mesh.add_boundary_edges( nodes, label )
+
     return the_mesh
 
 
+def is_closed( points, tolerance = 1e-9 ) :
+    '''
+    Whether the last point of a list repeats the first one, up to tolerance (relative to the size of the list).
+    '''
+
+    size = ( points.max( axis = 0 ) - points.min( axis = 0 ) ).max()
+
+    return allclose( points[0], points[-1], rtol = 0, atol = tolerance*size )
+
 def triangle_to_TriMesh_label( triangle_labels ) :
     return [ int(label) for label in triangle_labels.flatten() ]
 
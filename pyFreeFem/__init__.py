@@ -33,10 +33,15 @@ __copyright__ = "Copyright 2020"
 __license__ = "GPL"
 __version__ = "0.2"
 
-__all__ = ['TriMesh', 'FreeFemIO', 'FreeFemTools.FreeFemStatics', 'edpScript', 'pyFreeFem.functions']
+__all__ = ['TriMesh', 'FreeFemIO', 'FreeFemPool', 'edpCache', 'edpBatch', 'RunStats', 'FreeFemTools.FreeFemStatics', 'edpScript', 'nativeAssembly', 'pyFreeFem.functions']
 
 from pyFreeFem.FreeFemTools.FreeFemStatics import *
 from pyFreeFem.TriMesh import *
+from pyFreeFem.RunStats import *
 from pyFreeFem.FreeFemIO import *
 from pyFreeFem.edpScript import *
+from pyFreeFem.FreeFemPool import *
+from pyFreeFem.edpCache import *
+from pyFreeFem.nativeAssembly import *
 from pyFreeFem.functions import *
+from pyFreeFem.edpBatch import *
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Olivier Devauchelle
+#
+# Many thanks to Eric Lajeunesse, Anaïs Abramian, Valentin Jules & Hugo Chauvet.
+#
+# When used in a scientific publication, please cite:
+#
+# Boltzmann Distribution of Sediment Transport, A. Abramian, O. Devauchelle,
+# G. Seizilles, E. Lajeunesse, Physical Review Letters, 123, 014501, 2019
+
+
+from copy import copy
+
+from .edpScript import edpScript, edpBlock
+from .FreeFemTools.edpTools import flagize
+from .functions import InputScript, native_gradient_matrices, gradient_script, gradient_from_output, projector_script, projector_from_Gramians, interpolation_script
+
+class edpHandle :
+    '''
+    Result of a call recorded in an edpBatch, available once the batch has run.
+
+    value = handle.result()
+    '''
+
+    def __init__( self, batch, postprocess = None ) :
+
+        self.batch = batch
+        self.postprocess = postprocess
+        self.done = False
+        self.value = None
+
+    def set_output( self, output ) :
+
+        if self.postprocess is None :
+            self.value = output
+        else :
+            self.value = self.postprocess( output )
+
+        self.done = True
+
+    def result( self ) :
+        '''
+        The result of the recorded call. Runs the batch if needed.
+        '''
+
+        if not self.done :
+            self.batch.run()
+
+        return self.value
+
+class edpBatch :
+    '''
+    Records independent computations on the same mesh, and runs them all in a single FreeFem++ process.
+
+    with pyff.edpBatch( Th ) as batch :
+        gradients = batch.gradient_matrices( P1 = 'P2' )
+        projector = batch.get_projector( 'P2', 'P1' )
+        matrices = batch.add( pyff.VarfScript( ... ) )
+
+    grad_x = gradients.result()['grad_x']
+
+    The mesh is saved and read once. Each recorded script runs in its own scope (between braces), so that
+    they may declare the same variables, and its outputs are renamed. The batch runs when leaving the with
+    statement, or when the result of a pending handle is requested.
+    '''
+
+    def __init__( self, Th, verbose = False, backend = None, cache = None ) :
+
+        '''
+        Arguments:
+            Th (TriMesh) : the mesh shared by all recorded scripts, named Th in FreeFem++
+            verbose, backend, cache : see edpScript.get_output
+        '''
+
+        self.Th = Th
+        self.verbose = verbose
+        self.backend = backend
+        self.cache = cache
+
+        self.pending = [] # ( prefix, script, kwargs_input, handle )
+        self.nb_recorded = 0
+
+    def add( self, script, postprocess = None, **kwargs_input ) :
+        '''
+        handle = batch.add( script, postprocess = None, **kwargs_input )
+
+        Records a script which uses the mesh Th (without reading it). handle.result() is its output dictionnary,
+        transformed by postprocess if provided. kwargs_input are the postponed inputs of the script.
+        '''
+
+        prefix = 'batch' + str( self.nb_recorded ) + '_'
+        self.nb_recorded += 1
+
+        handle = edpHandle( self, postprocess = postprocess )
+        self.pending += [ ( prefix, script, kwargs_input, handle ) ]
+
+        return handle
+
+    def gradient_matrices( self, P0 = 'P0', P1 = 'P1' ) :
+        '''
+        Deferred version of gradient_matrices.
+        '''
+
+        if P0 == 'P0' and P1 == 'P1' : # no need for FreeFem++
+            handle = edpHandle( self )
+            handle.set_output( native_gradient_matrices( self.Th ) )
+            return handle
+
+        return self.add( gradient_script( P0 = P0, P1 = P1 ), postprocess = lambda output : gradient_from_output( output, P0 = P0 ) )
+
+    def get_projector( self, P_in, P_out, operator = False, lumped = False ) :
+        '''
+        Deferred version of get_projector.
+        '''
+
+        return self.add( projector_script( P_in, P_out ), postprocess = lambda output : projector_from_Gramians( output, operator = operator, lumped = lumped ) )
+
+    def interpolate( self, u, P_in, P_out ) :
+        '''
+        Deferred version of interpolate.
+        '''
+
+        return self.add( interpolation_script( u, P_in, P_out ), postprocess = lambda output : output['uOut'] )
+
+    def get_script( self ) :
+        '''
+        script, kwargs_input, outputs = batch.get_script()
+
+        The merged script of all pending calls. outputs[i] lists the ( name in merged script, original name ) of the outputs of the i-th pending call.
+        '''
+
+        script = InputScript( Th = self.Th )
+        kwargs_input = {}
+        outputs = []
+
+        for prefix, recorded_script, recorded_kwargs, _ in self.pending :
+
+            script += edpBlock( '{', name = prefix + 'open_scope' )
+
+            outputs += [ [] ]
+
+            for block in recorded_script.blocks :
+
+                block = copy( block )
+                block.input = [ copy( input ) for input in block.input ]
+                block.output = [ copy( output ) for output in block.output ]
+
+                for input in block.input : # postponed inputs are renamed, not their FreeFem++ variables
+                    input.tempfile = None
+                    input.saved_fingerprint = None
+                    input.variable_names = input.variable_names.copy()
+
+                    if input.source is None :
+                        kwargs_input[ prefix + input.name ] = recorded_kwargs[ input.name ]
+
+                    input.name = prefix + input.name
+
+                for output in block.output :
+                    outputs[-1] += [ ( prefix + output.name, output.name ) ]
+                    output.tempfile = None
+                    output.name = prefix + output.name
+                    output.flag = flagize( output.name )
+
+                script += block
+
+            script += edpBlock( '}', name = prefix + 'close_scope' )
+
+        return script, kwargs_input, outputs
+
+    def run( self ) :
+        '''
+        Run all pending calls in a single FreeFem++ process, and set the results of their handles.
+        '''
+
+        if len( self.pending ) == 0 :
+            return
+
+        script, kwargs_input, outputs = self.get_script()
+
+        try :
+            output = script.get_output( verbose = self.verbose, backend = self.backend, cache = self.cache, **kwargs_input )
+        finally :
+            script.clean_temp_files()
+
+        for ( _, _, _, handle ), handle_outputs in zip( self.pending, outputs ) :
+            handle.set_output( { name : output[ batch_name ] for batch_name, name in handle_outputs } )
+
+        self.pending = []
+
+    def __enter__( self ) :
+        return self
+
+    def __exit__( self, exception_type, *args ) :
+
+        if exception_type is None :
+            self.run()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Olivier Devauchelle
+#
+# Many thanks to Eric Lajeunesse, Anaïs Abramian, Valentin Jules & Hugo Chauvet.
+#
+# When used in a scientific publication, please cite:
+#
+# Boltzmann Distribution of Sediment Transport, A. Abramian, O. Devauchelle,
+# G. Seizilles, E. Lajeunesse, Physical Review Letters, 123, 014501, 2019
+
+import os
+import numpy as np
+from json import loads, dumps
+from hashlib import sha256
+from zipfile import BadZipFile
+from tempfile import NamedTemporaryFile
+from scipy.sparse import csr_matrix, issparse
+
+from .TriMesh import TriMesh
+from .FreeFemTools.edpTools import input_to_stdin
+
+default_cache_directory = os.path.join( os.path.expanduser('~'), '.cache', 'pyFreeFem' )
+
+class edpCache :
+    '''
+    On-disk cache of parsed FreeFem++ outputs, indexed by a hash of the script and its inputs.
+
+    cache = edpCache( directory = None, max_size = 1e9 )
+    output = script.get_output( cache = cache, Th = Th )
+    print( cache.hits, cache.misses )
+
+    Each entry is a .npz file. When the cache exceeds max_size (in bytes), the least recently used entries are removed.
+    '''
+
+    def __init__( self, directory = None, max_size = 1e9, compressed = False ) :
+
+        '''
+        Arguments:
+            directory (str) : where entries are stored. Defaults to ~/.cache/pyFreeFem
+            max_size (float) : maximum size of the cache, in bytes
+            compressed (bool) : compress entries (smaller, but slower)
+        '''
+
+        if directory is None :
+            directory = default_cache_directory
+
+        os.makedirs( directory, exist_ok = True )
+
+        self.directory = directory
+        self.max_size = max_size
+        self.compressed = compressed
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_key( self, edp_str, stdin = None, input_files = None, output_files = None ) :
+        '''
+        Hash of the script. Temporary file names are random, so input files are replaced by the hash of their content, and output files by their rank.
+        '''
+
+        if stdin is None :
+            stdin = []
+
+        for file_name in input_files or [] :
+            with open( file_name, 'rb' ) as the_file :
+                edp_str = edp_str.replace( file_name, sha256( the_file.read() ).hexdigest() )
+
+        for i, file_name in enumerate( output_files or [] ) :
+            edp_str = edp_str.replace( file_name, 'output_file_' + str(i) )
+
+        return sha256( ( edp_str + '\n' + input_to_stdin( stdin ) ).encode() ).hexdigest()
+
+    def get_file_name( self, key ) :
+        return os.path.join( self.directory, key + '.npz' )
+
+    def load( self, key ) :
+        '''
+        Returns the output stored under key. Raises KeyError if there is none.
+        '''
+
+        file_name = self.get_file_name( key )
+
+        try :
+            with np.load( file_name ) as data :
+                output = unpack_output( data )
+
+        except ( OSError, ValueError, BadZipFile ) : # missing or damaged entry
+            self.misses += 1
+            raise KeyError( key )
+
+        os.utime( file_name ) # for LRU eviction
+        self.hits += 1
+
+        return output
+
+    def save( self, key, output ) :
+
+        with NamedTemporaryFile( suffix = '.npz', dir = self.directory, delete = False ) as the_file :
+
+            if self.compressed :
+                np.savez_compressed( the_file, **pack_output( output ) )
+            else :
+                np.savez( the_file, **pack_output( output ) )
+
+        os.replace( the_file.name, self.get_file_name( key ) ) # concurrent readers never see partial files
+
+        self.evict()
+
+    def get_entries( self ) :
+        '''
+        List of ( last use, size, file name ), most recently used first.
+        '''
+
+        entries = []
+
+        for entry in os.scandir( self.directory ) :
+            if entry.name.endswith('.npz') :
+                try :
+                    stat = entry.stat()
+                    entries += [ ( stat.st_mtime, stat.st_size, entry.path ) ]
+                except FileNotFoundError : # removed by another process
+                    pass
+
+        return sorted( entries, reverse = True )
+
+    def get_size( self ) :
+        return sum( [ size for _, size, _ in self.get_entries() ] )
+
+    def evict( self ) :
+        '''
+        Remove least recently used entries until the cache fits in max_size.
+        '''
+
+        total_size = 0
+
+        for _, size, file_name in self.get_entries() :
+
+            total_size += size
+
+            if total_size > self.max_size :
+                try :
+                    os.remove( file_name )
+                except FileNotFoundError :
+                    pass
+
+    def clear( self ) :
+
+        for _, _, file_name in self.get_entries() :
+            os.remove( file_name )
+
+        self.hits = 0
+        self.misses = 0
+
+def pack_output( output ) :
+    '''
+    Converts a dictionnary of outputs (as returned by edpScript.get_output) into arrays.
+    '''
+
+    arrays = {}
+    types = {}
+
+    for name, value in output.items() :
+
+        if issparse( value ) :
+            value = csr_matrix( value )
+            types[name] = 'matrix'
+            arrays.update( { name + '/data' : value.data, name + '/indices' : value.indices, name + '/indptr' : value.indptr, name + '/shape' : np.array( value.shape ) } )
+
+        elif isinstance( value, TriMesh ) :
+            types[name] = 'mesh'
+            arrays[ name + '/json' ] = np.array( value.to_json() )
+
+        elif isinstance( value, ( bool, int, np.integer ) ) :
+            types[name] = 'int'
+            arrays[ name + '/value' ] = np.array( value )
+
+        elif isinstance( value, ( float, np.floating ) ) :
+            types[name] = 'real'
+            arrays[ name + '/value' ] = np.array( value )
+
+        else :
+            types[name] = 'vector'
+            arrays[ name + '/value' ] = np.asarray( value )
+
+    arrays['types'] = np.array( dumps( types ) )
+
+    return arrays
+
+def unpack_output( arrays ) :
+    '''
+    Inverse of pack_output.
+    '''
+
+    output = {}
+
+    for name, data_type in loads( str( arrays['types'] ) ).items() :
+
+        if data_type == 'matrix' :
+            output[name] = csr_matrix( ( arrays[ name + '/data' ], arrays[ name + '/indices' ], arrays[ name + '/indptr' ] ), shape = tuple( arrays[ name + '/shape' ] ) )
+
+        elif data_type == 'mesh' :
+            mesh = loads( str( arrays[ name + '/json' ] ) )
+
+            if len( mesh['boundary_edges'] ) == 0 :
+                mesh.pop( 'boundary_edges' )
+
+            output[name] = TriMesh( **mesh )
+
+        elif data_type == 'int' :
+            output[name] = int( arrays[ name + '/value' ] )
+
+        elif data_type == 'real' :
+            output[name] = float( arrays[ name + '/value' ] )
+
+        else :
+            output[name] = arrays[ name + '/value' ]
+
+    return output
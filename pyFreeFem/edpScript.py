@@ -1,5 +1,10 @@
 from pylab import savetxt, array
 from numpy import ndarray, float64
+from copy import copy
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+from os import cpu_count
+from time import perf_counter
 
 import sys
 sys.path.append('./../')
@@ -8,14 +13,36 @@ from .TriMesh import TriMesh
 from .FreeFemTools.edpTools import *
 from .FreeFemTools.FreeFemStatics import *
 from .FreeFemIO import *
+from .RunStats import RunStats, run_stats_hooks, call_run_stats_hooks
+
+block_clock_flag = flagize( 'block clock' )
+
+def get_block_clock_edp( block_index ) :
+    '''
+    edp code which prints the index of the block that just ended, and the FreeFem++ clock.
+    '''
+    return add_flags( 'cout << ' + str( block_index ) + ' << " " << clock() << endl;\n', block_clock_flag )
+
+def get_run_function( backend = None ) :
+    '''
+    Function which runs FreeFem++: run_FreeFem by default, or the run method of backend.
+    '''
+
+    if backend is None :
+        return run_FreeFem
+    else :
+        return backend.run
 
 class edpOutput :
     '''
     An output from FreeFem++: mesh, matrix or vector.
     '''
-    def __init__( self, data_type, name, FreeFem_name = None, flag = None, variable_names = None ) :
+
+    default_channel = 'stdout'
+
+    def __init__( self, data_type, name, FreeFem_name = None, flag = None, variable_names = None, channel = None, tempfile = None ) :
         '''
-        edpOutput( self, type, name, FreeFem_name = None, flag = None, variable_names = None )
+        edpOutput( self, type, name, FreeFem_name = None, flag = None, variable_names = None, channel = None )
 
         Arguments:
             type (str): 'mesh', 'matrix' or 'vector'
@@ -23,10 +50,17 @@ class edpOutput :
             FreeFem_name (str): name of the variable in the edp file
             flag (str): flag signalling the output in the FreeFem++ stream
             variable_names (dict) : translation dictionnary for FreeFem++ variables
+            channel (str) : 'stdout' (FreeFem++ console) or 'file' (full-precision temporary file, real numbers only). Defaults to edpOutput.default_channel.
         '''
 
         self.type = data_type
         self.name = name
+        self.tempfile = tempfile
+
+        if channel is None :
+            self.channel = self.default_channel
+        else :
+            self.channel = channel
 
         if FreeFem_name is None :
             self.FreeFem_name = FreeFemize( name, type = 'variable' )
@@ -45,8 +79,20 @@ class edpOutput :
 
     def get_edp( self ) :
 
-        if self.type == 'matrix' :
-            variable_names = self.variable_names
+        if self.channel == 'file' :
+
+            if self.tempfile is None :
+                self.tempfile = NamedTemporaryFile( suffix = '.ffo', mode = 'w', dir = memory_tempfile_dir )
+
+            variable_names = self.variable_names.copy() # same translation as the stdout channel
+            variable_names.pop( '_file_name_', None )
+            variable_names.update( { '_matrix_name_' : self.FreeFem_name, '_u_' : self.FreeFem_name, '_Th_' : self.FreeFem_name, '_number_name_' : self.FreeFem_name } )
+            variable_names.update( { '_file_name_' : self.tempfile.name } ) # last, since file names are random
+
+            edp = export_file_edp( self.type, **variable_names )
+
+        elif self.type == 'matrix' :
+            variable_names = self.variable_names.copy() # do not alter default_variable_names
             variable_names.update( { '_matrix_name_' : self.FreeFem_name } )
             edp = export_matrix_edp( create_and_add_flags = False, **variable_names )
 
@@ -61,29 +107,64 @@ class edpOutput :
 
         return add_flags( edp, self.flag )
 
-    def parse( self, FreeFem_output ) :
+    def parse( self, FreeFem_output, index = None, occurrence = 0 ) :
+        '''
+        Arguments:
+            FreeFem_output (str) : FreeFem++ output
+            index (dict) : flag positions in FreeFem_output, from index_FreeFem_output
+            occurrence (int) : rank of the output, when it is printed several times (see edpScript.get_output_sweep)
+        '''
+
+        if self.channel == 'file' :
+            return self.parse_file()
+
+        return self.parse_str( parse_FreeFem_output( FreeFem_output, self.flag, index, occurrence ) )
+
+    def parse_str( self, output_str ) :
+        '''
+        Parse the text printed by FreeFem++ between the flags of this output.
+        '''
+
+        if self.type == 'matrix' :
+            return FreeFem_str_to_matrix( output_str )
+
+        elif self.type == 'vector' :
+            return FreeFem_str_to_vector( output_str )
+
+        elif self.type == 'mesh' :
+            return FreeFem_str_to_mesh( output_str )
+
+        elif self.type == 'real':
+            return  float( output_str )
+
+        elif self.type == 'int':
+            return  int( output_str )
+
+    def parse_file( self ) :
 
         if self.type == 'matrix' :
-            return FreeFem_str_to_matrix( parse_FreeFem_output( FreeFem_output, self.flag  ) )
+            return FreeFem_file_to_matrix( self.tempfile.name )
 
         elif self.type == 'vector' :
-            return FreeFem_str_to_vector( parse_FreeFem_output( FreeFem_output, self.flag ) )
+            return FreeFem_file_to_vector( self.tempfile.name )
 
         elif self.type == 'mesh' :
-            return FreeFem_str_to_mesh( parse_FreeFem_output( FreeFem_output, self.flag ) )
+            return FreeFem_file_to_mesh( self.tempfile.name )
 
         elif self.type == 'real':
-            return  float( parse_FreeFem_output( FreeFem_output, self.flag ) )
+            return float( FreeFem_file_to_array( self.tempfile.name )[0] )
 
         elif self.type == 'int':
-            return  int( parse_FreeFem_output( FreeFem_output, self.flag ) )
+            return int( FreeFem_file_to_array( self.tempfile.name )[0] )
 
 class edpInput :
     '''
     Input into FreeFem.
     '''
 
-    def __init__( self, name, source = None, FreeFem_name = None, data_type = None, tempfile = None, declare = True, variable_names = None ) :
+    default_vector_format = 'lines'
+
+    def __init__( self, name, source = None, FreeFem_name = None, data_type = None, tempfile = None, declare = True, variable_names = None, vector_format = None ) :
         '''
         edpInput( source, name, FreeFem_name = None, data_type = None )
 
@@ -92,12 +173,22 @@ class edpInput :
             name (str) : input name
             FreeFem_name (str) : name of the corresponding FreeFem++ variable
             data_type (str) : mesh, vector, matrix or number
+            vector_format (str) : 'lines' (read value by value) or 'array' (read at once). Defaults to edpInput.default_vector_format.
         '''
 
         self.source = source
         self.name = name
         self.tempfile = tempfile # including when it's None
         self.declare = declare
+        self.saved_fingerprint = None # what tempfile contains
+
+        self.save_time = 0. # last call to get_edp
+        self.saved_bytes = 0
+
+        if vector_format is None :
+            self.vector_format = self.default_vector_format
+        else :
+            self.vector_format = vector_format
 
         if variable_names is None :
             variable_names = {}
@@ -137,6 +228,9 @@ class edpInput :
 
         edp_str = ''
 
+        self.save_time = 0.
+        self.saved_bytes = 0
+
         if self.source is None :
             source = kwargs[ self.name ] # the source is input when calling get_edp
 
@@ -147,8 +241,10 @@ class edpInput :
 
             if self.tempfile is None :
                 self.tempfile = NamedTemporaryFile( suffix = '.msh', buffering = 1, mode = 'w', dir = memory_tempfile_dir )
+                self.saved_fingerprint = None
 
-            savemesh( file = self.tempfile, mesh = source )
+            if self.must_save( source ) :
+                self.save( savemesh, mesh = source )
 
             if self.declare :
                 edp_str += 'mesh _Th_;\n'
@@ -165,14 +261,25 @@ class edpInput :
 
             if self.tempfile is None :
                 self.tempfile = NamedTemporaryFile( suffix = '.ffv', buffering = 1, mode = 'w+', dir = memory_tempfile_dir )
+                self.saved_fingerprint = None
 
             # savetxt( self.tempfile.name, source ) # using the file handle would be better, but then writing doesn't complete
-            savevector( vector = source, file = self.tempfile )
+            if self.must_save( source ) :
+                self.save( savevector, vector = source, header = ( self.vector_format == 'array' ) )
 
             if self.declare :
                 edp_str += '_VhU_ _vector_name_;\n'
 
-            edp_str += '''
+            if self.vector_format == 'array' :
+                edp_str += '''
+                {
+                    ifstream InputFile("_vector_file_name_");
+                    InputFile >> _vector_name_[];
+                }
+            '''
+
+            else :
+                edp_str += '''
                 {
                     ifstream InputFile("_vector_file_name_");
 
@@ -207,6 +314,32 @@ class edpInput :
 
         return edp_str
 
+    def save( self, save_function, **kwargs ) :
+        '''
+        Write into tempfile with save_function (savemesh or savevector), and record the time and size of the writing.
+        '''
+
+        start = perf_counter()
+        save_function( file = self.tempfile, **kwargs )
+
+        self.save_time = perf_counter() - start
+        self.saved_bytes = self.tempfile.tell()
+
+    def must_save( self, source ) :
+        '''
+        Whether source differs from the content of tempfile, in which case its fingerprint is updated.
+        A TriMesh changed in place must be invalidated (TriMesh.invalidate) to be saved again.
+        '''
+
+        fingerprint = ( self.vector_format, get_fingerprint( source ) )
+
+        if fingerprint == self.saved_fingerprint :
+            return False
+
+        self.saved_fingerprint = fingerprint
+
+        return True
+
     def get_stdin( self, **kwargs ) :
 
         stdin = []
@@ -356,18 +489,48 @@ class edpScript :
 
         return self
 
-    def get_edp( self, **kwargs_input ) :
+    def get_edp( self, timed = False, **kwargs_input ) :
+        '''
+        Arguments:
+            timed (bool) : print the FreeFem++ clock after each block (see get_block_times)
+        '''
 
         edp = ''
 
         if not self.name is None :
             edp += headerFrame( FreeFemize( self.name, type = 'header' ) )
 
-        for block in self.blocks :
+        if timed :
+            edp += get_block_clock_edp( -1 )
+
+        for block_index, block in enumerate( self.blocks ) :
             edp += block.get_edp( **kwargs_input )
 
+            if timed :
+                edp += get_block_clock_edp( block_index )
+
         return edp
 
+    def get_block_times( self, FreeFem_output, index = None ) :
+        '''
+        List of ( block name, duration ) from the output of a timed script (see get_edp).
+
+        Each clock is tagged with the index of the block that just ended, and the time since the previous clock is added
+        to that block. Blocks run several times (e.g. in a loop spanning several blocks) get their total time.
+        '''
+
+        if index is None :
+            index = index_FreeFem_output( FreeFem_output )
+
+        clocks = [ parse_FreeFem_output( FreeFem_output, block_clock_flag, index, occurrence ).split() for occurrence in range( len( index.get( block_clock_flag, [] ) ) ) ]
+
+        durations = {}
+
+        for ( _, start ), ( block_index, end ) in zip( clocks[:-1], clocks[1:] ) :
+            durations[ int( block_index ) ] = durations.get( int( block_index ), 0. ) + float( end ) - float( start )
+
+        return [ ( self.blocks[ block_index ].name, durations[ block_index ] ) for block_index in sorted( durations ) ]
+
     def get_stdin( self, **kwargs_input ) :
 
         stdin = []
@@ -381,17 +544,51 @@ class edpScript :
 
         for block in self.blocks :
 
-            for input in block.input :
+            for input_or_output in block.input + block.output :
 
-                if not input.tempfile is None :
+                if not input_or_output.tempfile is None :
 
                     if verbose :
-                        print( 'Erasing temporary file ' + input.tempfile.name )
+                        print( 'Erasing temporary file ' + input_or_output.tempfile.name )
 
-                    input.tempfile.close()
+                    input_or_output.tempfile.close()
+                    input_or_output.tempfile = None
+
+    def isolated_copy( self ) :
+        '''
+        Copy of the script whose inputs have their own temporary files, so that it can run concurrently with the original.
+        '''
+
+        script = edpScript( name = self.name )
+
+        for block in self.blocks :
+
+            block = copy( block )
+            block.input = [ copy( input ) for input in block.input ]
+
+            for input in block.input :
+                input.tempfile = None
+                input.saved_fingerprint = None
+                input.variable_names = input.variable_names.copy()
+
+            block.output = [ copy( output ) for output in block.output ]
+
+            for output in block.output :
+                output.tempfile = None
+
+            script.blocks += [ block ]
+
+        return script
+
+    def run( self, verbose = False, backend = None, **kwargs_input ) :
+        '''
+        Run the script with FreeFem++, and return its raw output.
 
-    def run( self, verbose = False, **kwargs_input ) :
-        freefem_output = run_FreeFem( self.get_edp( **kwargs_input ), stdin =  self.get_stdin( **kwargs_input ), verbose = verbose )
+        Arguments:
+            backend : object with a run method like run_FreeFem (e.g. FreeFemPool). Defaults to run_FreeFem.
+        '''
+
+        freefem_output = get_run_function( backend )( self.get_edp( **kwargs_input ), stdin =  self.get_stdin( **kwargs_input ), verbose = verbose )
         # self.clean_temp_files()
         return freefem_output
 
@@ -399,14 +596,354 @@ class edpScript :
 
         FreeFem_data = {}
 
+        index = index_FreeFem_output( FreeFem_output, self.get_flags() ) # single pass over the output
+
+        for block in self.blocks :
+            for output in block.output :
+                FreeFem_data[ output.name ] = output.parse( FreeFem_output, index = index )
+
+        return FreeFem_data
+
+    def get_output( self, verbose = False, backend = None, cache = None, stats = False, **kwargs_input ) :
+        '''
+        Run the script with FreeFem++, and return its parsed output as a dictionnary.
+
+        Arguments:
+            backend : see run
+            cache (edpCache) : if provided, FreeFem++ only runs when the script and its inputs are not in the cache.
+            stats (bool) : if True, returns ( output, RunStats ). The script then prints the FreeFem++ clock after each block (this does not change the cache key).
+
+        The RunStats of each run are also passed to the hooks registered with add_run_stats_hook.
+        '''
+
+        run_stats = RunStats( name = self.name )
+        timed = stats or len( run_stats_hooks ) > 0
+
+        with run_stats.phase( 'edp' ) :
+            edp_str = self.get_edp( timed = timed, **kwargs_input )
+            stdin = self.get_stdin( **kwargs_input )
+
+        for block in self.blocks :
+            for input in block.input :
+                run_stats.phases['edp'] -= input.save_time
+                run_stats.phases['save'] = run_stats.phases.get( 'save', 0. ) + input.save_time
+                run_stats.temp_bytes_written += input.saved_bytes
+
+        output = None
+
+        if not cache is None :
+
+            with run_stats.phase( 'cache' ) :
+
+                if timed : # the key does not depend on the clocks
+                    key = cache.get_key( self.get_edp( **kwargs_input ), stdin, *self.get_temp_file_names() )
+                else :
+                    key = cache.get_key( edp_str, stdin, *self.get_temp_file_names() )
+
+                try :
+                    output = cache.load( key )
+                    run_stats.cache_hit = True
+                except KeyError :
+                    pass
+
+        if output is None :
+
+            if backend is None :
+                FreeFem_output, FreeFem_stats = run_FreeFem( edp_str, stdin = stdin, verbose = verbose, stats = True )
+                run_stats.update( FreeFem_stats )
+
+            else :
+                with run_stats.phase( 'run' ) :
+                    FreeFem_output = backend.run( edp_str, stdin = stdin, verbose = verbose )
+
+                if not FreeFem_output is None :
+                    run_stats.stdout_size = len( FreeFem_output.encode() )
+
+            with run_stats.phase( 'parse' ) :
+
+                output = self.parse( FreeFem_output ) # fails if FreeFem++ failed
+
+                if timed :
+                    run_stats.block_times = self.get_block_times( FreeFem_output )
+
+            for file_name in self.get_temp_file_names()[1] :
+                run_stats.temp_bytes_read += os.path.getsize( file_name )
+
+            if not cache is None :
+                cache.save( key, output )
+
+        call_run_stats_hooks( run_stats )
+
+        if stats :
+            return output, run_stats
+
+        return output
+
+    def get_flags( self ) :
+        '''
+        Flags of the outputs printed on stdout.
+        '''
+
+        return [ output.flag for block in self.blocks for output in block.output if output.channel == 'stdout' ]
+
+    def get_temp_file_names( self ) :
+        '''
+        input_files, output_files = script.get_temp_file_names()
+        '''
+
+        input_files = []
+        output_files = []
+
+        for block in self.blocks :
+
+            for input in block.input :
+                if not input.tempfile is None :
+                    input.tempfile.flush()
+                    input_files += [ input.tempfile.name ]
+
+            for output in block.output :
+                if not output.tempfile is None :
+                    output_files += [ output.tempfile.name ]
+
+        return input_files, output_files
+
+    async def run_async( self, verbose = False, semaphore = None, **kwargs_input ) :
+        '''
+        Coroutine version of run, based on run_FreeFem_async.
+        '''
+        return await run_FreeFem_async( self.get_edp( **kwargs_input ), stdin = self.get_stdin( **kwargs_input ), verbose = verbose, semaphore = semaphore )
+
+    async def get_output_async( self, verbose = False, semaphore = None, **kwargs_input ) :
+        '''
+        Coroutine version of get_output. Calls can run concurrently, since each uses its own temporary files.
+
+        Example:
+            outputs = await asyncio.gather( *[ script.get_output_async( W = W ) for W in W_list ] )
+        '''
+
+        script = self.isolated_copy()
+
+        try :
+            return script.parse( await script.run_async( verbose = verbose, semaphore = semaphore, **kwargs_input ) )
+        finally :
+            script.clean_temp_files()
+
+    def get_output_many( self, list_of_kwargs, max_workers = None, ordered = True, verbose = False, backend = None, cache = None ) :
+        '''
+        Run the script once per set of inputs, in parallel.
+
+        outputs = script.get_output_many( [ dict( Th = Th, W = W ) for W in W_list ], max_workers = 4 )
+
+        Arguments:
+            list_of_kwargs (list of dict) : inputs of each run, as for get_output
+            max_workers (int) : number of simultaneous FreeFem++ processes. Defaults to the number of cores.
+            ordered (bool) : if False, returns an iterator over ( index, output ) pairs, in order of completion.
+
+        Each run uses its own temporary files. FreeFem++ runs in separate processes, hence the threads.
+        '''
+
+        if max_workers is None :
+            max_workers = cpu_count()
+
+        def get_output( kwargs_input ) :
+
+            script = self.isolated_copy()
+
+            try :
+                return script.get_output( verbose = verbose, backend = backend, cache = cache, **kwargs_input )
+            finally :
+                script.clean_temp_files()
+
+        if ordered :
+            with ThreadPoolExecutor( max_workers = max_workers ) as executor :
+                return list( executor.map( get_output, list_of_kwargs ) )
+
+        def iter_outputs() :
+            with ThreadPoolExecutor( max_workers = max_workers ) as executor :
+
+                futures = { executor.submit( get_output, kwargs_input ) : index for index, kwargs_input in enumerate( list_of_kwargs ) }
+
+                for future in as_completed( futures ) :
+                    yield futures[future], future.result()
+
+        return iter_outputs()
+
+    def iter_output( self, verbose = False, **kwargs_input ) :
+        '''
+        Run the script with FreeFem++, and yield ( name, value ) for each output, as soon as FreeFem++ prints it.
+
+        for name, u in script.iter_output( Th = Th ) :
+            plot( u )
+
+        An output printed several times (e.g. in a time loop) is yielded each time. Stopping the iteration (or closing
+        the generator) kills FreeFem++. Outputs written into files (channel 'file') are yielded when FreeFem++ exits.
+        '''
+
+        outputs = {}
+
         for block in self.blocks :
             for output in block.output :
-                FreeFem_data[ output.name ] = output.parse( FreeFem_output )
+                outputs[ output.flag ] = output
+
+        stream = stream_FreeFem( self.get_edp( **kwargs_input ), stdin = self.get_stdin( **kwargs_input ), verbose = verbose, flags = self.get_flags() )
+
+        try :
+            for flag, output_str in stream :
+
+                if flag in outputs and outputs[flag].channel == 'stdout' :
+                    yield outputs[flag].name, outputs[flag].parse_str( output_str )
+
+        finally :
+            stream.close()
+
+        for output in outputs.values() :
+            if output.channel == 'file' :
+                yield output.name, output.parse_file()
+
+    ###################################
+    #
+    # SWEEP
+    #
+    ###################################
+
+    def get_sweep_blocks( self, sweep_names, loop_start = None ) :
+        '''
+        blocks_before, loop_blocks = script.get_sweep_blocks( sweep_names, loop_start = None )
+
+        The loop starts at block loop_start, by default the first block which reads a swept input.
+        In the loop, outputs are printed in the console, since a temporary file would be overwritten at each iteration.
+        '''
+
+        if loop_start is None :
+
+            for loop_start, block in enumerate( self.blocks ) :
+                if any( [ input.name in sweep_names for input in block.input ] ) :
+                    break
+
+            else :
+                raise ValueError( 'No block reads the swept inputs: ' + ', '.join( sweep_names ) )
+
+        for block in self.blocks[ :loop_start ] :
+            for input in block.input :
+                if input.name in sweep_names :
+                    raise ValueError( 'Input ' + input.name + ' is read before the loop starts.' )
+
+        loop_blocks = []
+
+        for block in self.blocks[ loop_start: ] :
+
+            for input in block.input :
+                if input.name in sweep_names and not input.type in [ 'real', 'int' ] :
+                    raise ValueError( 'Only int and real inputs can be swept, not ' + input.name + '.' )
+
+            block = copy( block )
+            block.output = [ copy( output ) for output in block.output ]
+
+            for output in block.output :
+                output.channel = 'stdout'
+
+            loop_blocks += [ block ]
+
+        return self.blocks[ :loop_start ], loop_blocks
+
+    def get_sweep_edp( self, list_of_kwargs, loop_start = None, **kwargs_input ) :
+
+        blocks_before, loop_blocks = self.get_sweep_blocks( list_of_kwargs[0].keys(), loop_start )
+
+        edp = ''
+
+        if not self.name is None :
+            edp += headerFrame( FreeFemize( self.name, type = 'header' ) )
+
+        for block in blocks_before :
+            edp += block.get_edp( **kwargs_input )
+
+        edp += headerFrame( 'SWEEP START' )
+        edp += 'int sweepSize;\ncin >> sweepSize;\n\n'
+        edp += 'for( int sweepIteration = 0; sweepIteration < sweepSize; sweepIteration++ )\n{\n'
+
+        for block in loop_blocks :
+            edp += block.get_edp( **dict( kwargs_input, **list_of_kwargs[0] ) ) # swept inputs are only declared here
+
+        edp += '}\n'
+        edp += headerFrame( 'SWEEP END' )
+
+        return edp
+
+    def get_sweep_stdin( self, list_of_kwargs, loop_start = None, **kwargs_input ) :
+
+        blocks_before, loop_blocks = self.get_sweep_blocks( list_of_kwargs[0].keys(), loop_start )
+
+        stdin = []
+
+        for block in blocks_before :
+            stdin += block.get_stdin( **kwargs_input )
+
+        stdin += [ len( list_of_kwargs ) ]
+
+        for kwargs_sweep in list_of_kwargs :
+            for block in loop_blocks :
+                stdin += block.get_stdin( **dict( kwargs_input, **kwargs_sweep ) )
+
+        return stdin
+
+    def parse_sweep( self, FreeFem_output, sweep_names, nb_iterations, loop_start = None, stack = True ) :
+
+        blocks_before, loop_blocks = self.get_sweep_blocks( sweep_names, loop_start )
+
+        FreeFem_data = {}
+
+        index = index_FreeFem_output( FreeFem_output, self.get_flags() )
+
+        for block in blocks_before :
+            for output in block.output :
+                FreeFem_data[ output.name ] = output.parse( FreeFem_output, index = index )
+
+        for block in loop_blocks :
+            for output in block.output :
+
+                values = [ output.parse( FreeFem_output, index = index, occurrence = i ) for i in range( nb_iterations ) ]
+
+                if stack and output.type in [ 'real', 'int' ] :
+                    values = np.array( values )
+
+                elif stack and output.type == 'vector' and len( set( [ len( value ) for value in values ] ) ) == 1 :
+                    values = np.array( values ) # one line per iteration
+
+                FreeFem_data[ output.name ] = values
 
         return FreeFem_data
 
-    def get_output( self, verbose = False, **kwargs_input ) :
-        return self.parse( self.run( verbose = verbose,  **kwargs_input ) )
+    def get_output_sweep( self, list_of_kwargs, loop_start = None, stack = True, verbose = False, backend = None, **kwargs_input ) :
+        '''
+        Run the script for many values of its int and real inputs, in a single FreeFem++ process.
+
+        output = script.get_output_sweep( [ dict( W = W ) for W in W_list ], Th = Th )
+        Q = output['discharge'] # array, one value per W
+
+        The blocks which follow the first block reading a swept input are wrapped into a FreeFem++ loop, which reads
+        one set of inputs from stdin at each iteration. The blocks before the loop run only once.
+
+        Arguments:
+            list_of_kwargs (list of dict) : swept inputs (int or real) of each iteration. All dicts have the same keys.
+            loop_start (int) : index of the first block of the loop, if it should start before the first swept input.
+            stack (bool) : if True, real, int and vector outputs of the loop are stacked into arrays (vectors only if they have the same length).
+            kwargs_input : inputs common to all iterations, as for get_output
+            backend : see run
+
+        Returns a dictionnary, as get_output. Each output of the loop is a list (or array) with one element per iteration.
+        Variables declared before the loop keep their modifications from one iteration to the next. Outputs of the loop
+        are always printed in the console (channel 'stdout').
+        '''
+
+        sweep_names = list( list_of_kwargs[0].keys() )
+
+        edp_str = self.get_sweep_edp( list_of_kwargs, loop_start = loop_start, **kwargs_input )
+        stdin = self.get_sweep_stdin( list_of_kwargs, loop_start = loop_start, **kwargs_input )
+
+        FreeFem_output = get_run_function( backend )( edp_str, stdin = stdin, verbose = verbose )
+
+        return self.parse_sweep( FreeFem_output, sweep_names, len( list_of_kwargs ), loop_start = loop_start, stack = stack )
 
     def pprint( self ) :
         edp_pprint( self.get_edp() )
@@ -1,7 +1,9 @@
 from pylab import savetxt, array, shape, diff, real, imag, triu
-from numpy import ndarray
-from scipy.sparse.linalg import spsolve
-from scipy.sparse import lil_matrix
+from numpy import ndarray, count_nonzero, iscomplexobj, ascontiguousarray
+import re
+import numpy as np
+from scipy.sparse.linalg import spsolve, splu, LinearOperator, aslinearoperator
+from scipy.sparse import lil_matrix, csr_matrix, csc_matrix, coo_matrix, diags
 
 
 import sys
@@ -11,10 +13,13 @@ from .edpScript import edpScript, edpInput, edpOutput
 from .FreeFemTools.edpTools import edp_function, FreeFemize, headerFrame, flagize
 from .FreeFemTools.FreeFemStatics import default_variable_names
 from .edpScript import *
+from .nativeAssembly import native_varf, P1_gradient
 
-def InputScript( fespace = None, declare = True, **inputs ) :
+def InputScript( fespace = None, declare = True, vector_format = None, **inputs ) :
     '''
-    script = InputScript( fespace = None, declare = True, **inputs )
+    script = InputScript( fespace = None, declare = True, vector_format = None, **inputs )
+
+    vector_format : 'lines' or 'array' (see edpInput)
     '''
     script = edpScript('')
 
@@ -26,21 +31,23 @@ def InputScript( fespace = None, declare = True, **inputs ) :
     for input_name, source in inputs.items() :
 
         if isinstance( source, str ) :
-            script += edpInput( name = input_name, data_type = source, variable_names = variable_names, declare = declare )
+            script += edpInput( name = input_name, data_type = source, variable_names = variable_names, declare = declare, vector_format = vector_format )
         else :
-            script += edpInput( name = input_name, source = source, variable_names = variable_names, declare = declare )
+            script += edpInput( name = input_name, source = source, variable_names = variable_names, declare = declare, vector_format = vector_format )
 
     return script
 
 
-def OutputScript( **outputs ) :
+def OutputScript( channel = None, **outputs ) :
     '''
-    script = OutputScript( **outputs )
+    script = OutputScript( channel = None, **outputs )
+
+    channel : 'stdout' or 'file' (see edpOutput)
     '''
     script = edpScript('')
 
     for output_name, output_type in outputs.items() :
-        script += edpOutput( name = output_name, data_type = output_type )
+        script += edpOutput( name = output_name, data_type = output_type, channel = channel )
 
     return script
 
@@ -92,6 +99,49 @@ def VarfScript( functions = None, fespaces = None, **matrices ) :
 
     return script
 
+def assemble_varfs( Th, fespace = 'P1', functions = None, native = True, **matrices ) :
+    '''
+    Matrices of variational formulations on mesh Th, as VarfScript would export them on fespace Vh( Th, fespace ).
+
+    output = assemble_varfs( Th, stiffness = 'int2d(Th)( dx(u)*dx(v) + dy(u)*dy(v) )', Gramian = 'int2d(Th)( u*v )' )
+
+    On P1 elements, recognized varfs (see native_varf) are assembled with numpy, without FreeFem++.
+    The others are computed by FreeFem++, in a single run.
+    '''
+
+    if functions is None :
+        functions = ( 'u', 'v' )
+
+    output = {}
+    FreeFem_matrices = {}
+
+    for name, varf in matrices.items() :
+
+        matrix = None
+
+        if native and fespace == 'P1' :
+            default_functions = dict( zip( functions, ( 'u', 'v' ) ) )
+            functions_pattern = r'\b(' + '|'.join( re.escape( function ) for function in functions ) + r')\b'
+            varf = re.sub( functions_pattern, lambda match : default_functions[ match.group() ], varf ) # single pass, e.g. for functions = ( 'v', 'u' )
+
+            matrix = native_varf( Th, varf )
+
+        if matrix is None :
+            FreeFem_matrices[name] = matrices[name]
+        else :
+            output[name] = matrix
+
+    if len( FreeFem_matrices ) > 0 :
+
+        script = InputScript( Th = Th )
+        script += 'fespace ' + edp_function( 'Vh', 'Th', fespace ) + ';'
+        script += 'Vh ' + ', '.join( functions ) + ';'
+        script += VarfScript( functions = functions, **FreeFem_matrices )
+
+        output.update( script.get_output() )
+
+    return output
+
 def adaptmesh( Th, u = None, **kwargs ):
     '''
     TriMesh refinement using FreeFem++'s adaptmesh function.
@@ -142,12 +192,12 @@ def adaptmesh( Th, u = None, **kwargs ):
 
     return Th
 
-def interpolate( Th, u, P_in, P_out ):
+def interpolation_script( u, P_in, P_out ) :
     '''
-    w = interpolate( Th, u, P_in, P_out )
+    Script of interpolate, without its mesh input Th.
     '''
 
-    script = InputScript( Th = Th )
+    script = edpScript('')
 
     for fespace, fetype in { 'VhIn' : P_in, 'VhOut' : P_out }.items() :
         script += 'fespace ' + edp_function( fespace, 'Th', fetype ) + ';'
@@ -157,15 +207,71 @@ def interpolate( Th, u, P_in, P_out ):
     script += 'VhOut uOut = uIn;'
     script += OutputScript( uOut = 'vector' )
 
+    return script
+
+def interpolate( Th, u, P_in, P_out ):
+    '''
+    w = interpolate( Th, u, P_in, P_out )
+    '''
+
+    script = InputScript( Th = Th )
+    script += interpolation_script( u, P_in, P_out )
+
     return script.get_output()['uOut']
 
 
-def get_projector( Th, P_in, P_out ):
+class Projector( LinearOperator ) :
     '''
-    P = get_projector( Th, P_in, P_out )
+    Projection from one finite-element space to another, applied lazily.
+
+    P = Projector( GramianOO, GramianIO, lumped = False )
+    u_out = P@u_in
+
+    The Gramian of the output space is factorized once (LU). If lumped, or if it is diagonal (e.g. P0), it is replaced by the sums of its rows.
     '''
 
-    script = InputScript( Th = Th )
+    def __init__( self, GramianOO, GramianIO, lumped = False ) :
+
+        self.GramianIO = csr_matrix( GramianIO )
+
+        super().__init__( dtype = self.GramianIO.dtype, shape = self.GramianIO.shape )
+
+        diagonal = GramianOO.diagonal()
+
+        if lumped :
+            self.diagonal = array( GramianOO.sum( axis = 1 ) ).ravel()
+            self.LU = None
+
+        elif GramianOO.count_nonzero() == count_nonzero( diagonal ) :
+            self.diagonal = diagonal
+            self.LU = None
+
+        else :
+            self.diagonal = None
+            self.LU = splu( csc_matrix( GramianOO ) )
+
+    def solve( self, b ) :
+
+        if self.LU is None :
+            return b/self.diagonal.reshape( ( -1, ) + ( 1, )*( b.ndim - 1 ) )
+
+        if iscomplexobj( b ) :
+            return self.LU.solve( ascontiguousarray( real( b ) ) ) + 1j*self.LU.solve( ascontiguousarray( imag( b ) ) )
+
+        return self.LU.solve( b )
+
+    def _matvec( self, x ) :
+        return self.solve( self.GramianIO.dot( x ) )
+
+    def _matmat( self, X ) :
+        return self.solve( self.GramianIO.dot( X ) )
+
+def projector_script( P_in, P_out ) :
+    '''
+    Script of get_projector, without its mesh input Th. Its output is processed by projector_from_Gramians.
+    '''
+
+    script = edpScript('')
 
     for fespace, fetype in { 'VhIn' : P_in, 'VhOut' : P_out }.items() :
         script += 'fespace ' + edp_function( fespace, 'Th', fetype ) + ';'
@@ -180,13 +286,39 @@ def get_projector( Th, P_in, P_out ):
         fespaces = ( 'VhIn', 'VhOut' )
         )
 
-    output = script.get_output()
+    return script
+
+def projector_from_Gramians( output, operator = False, lumped = False ) :
+    '''
+    Projection matrix (or Projector) from the output of projector_script.
+    '''
 
     GramianOO = output['GramianOO']
     GramianIO = output['GramianIO']
 
+    if operator :
+        return Projector( GramianOO, GramianIO, lumped = lumped )
+
+    elif lumped :
+        return csr_matrix( diags( 1/array( GramianOO.sum( axis = 1 ) ).ravel() ).dot( GramianIO ) )
+
     return spsolve( GramianOO, GramianIO )
 
+def get_projector( Th, P_in, P_out, operator = False, lumped = False ):
+    '''
+    P = get_projector( Th, P_in, P_out, operator = False, lumped = False )
+
+    u_out = P@u_in
+
+    Returns a sparse matrix, unless operator is True: then a Projector keeps the output Gramian factorized, and never forms the projection matrix (which can be large, e.g. for P2 to P1).
+    With lumped = True, the output Gramian is replaced by the sums of its rows (an approximation, suitable for P1, not for P2).
+    '''
+
+    script = InputScript( Th = Th )
+    script += projector_script( P_in, P_out )
+
+    return projector_from_Gramians( script.get_output(), operator = operator, lumped = lumped )
+
 def gradient_matrices( Th, P0 = 'P0', P1 = 'P1' ) :
 
     '''
@@ -198,19 +330,56 @@ def gradient_matrices( Th, P0 = 'P0', P1 = 'P1' ) :
 
     dxv = matrices['grad_x']*v
     dyv = matrices['grad_y']*v
+
+    matrices['area'] is the Gramian of P0. If P0 = 'P0', it is diagonal, and matrices['areas'] is the vector of triangle areas.
+    With the default elements, the matrices are computed with numpy, otherwise by FreeFem++.
     '''
 
+    if P0 == 'P0' and P1 == 'P1' :
+        return native_gradient_matrices( Th )
+
     script = InputScript( Th = Th )
+    script += gradient_script( P0 = P0, P1 = P1 )
+
+    return gradient_from_output( script.get_output(), P0 = P0 )
+
+def native_gradient_matrices( Th ) :
+    '''
+    Output of gradient_matrices for P0 and P1 elements, computed with numpy.
+    '''
+
+    grad_x, grad_y, areas = P1_gradient( Th )
 
-    script += edpScript( 'fespace Vh0( Th, ' + P0 + ' ); fespace Vh1( Th, ' + P1 + ' );\n')
+    return { 'grad_x' : grad_x, 'grad_y' : grad_y, 'area' : csr_matrix( diags( areas ) ), 'areas' : areas }
+
+def gradient_script( P0 = 'P0', P1 = 'P1' ) :
+    '''
+    Script of gradient_matrices, without its mesh input Th. Its output is processed by gradient_from_output.
+    '''
+
+    script = edpScript( 'fespace Vh0( Th, ' + P0 + ' ); fespace Vh1( Th, ' + P1 + ' );\n')
 
     script += VarfScript( grad_x = 'int2d(Th)( u*dx(v) )', grad_y = 'int2d(Th)( u*dy(v) )', fespaces = ('Vh0', 'Vh1') )
     script += VarfScript( area = 'int2d(Th)( u*v )', fespaces = ('Vh0', 'Vh0') )
 
-    matrices = script.get_output()
+    return script
 
-    matrices['grad_x'] = spsolve( matrices['area'], matrices['grad_x'].T )
-    matrices['grad_y'] = spsolve( matrices['area'], matrices['grad_y'].T )
+def gradient_from_output( matrices, P0 = 'P0' ) :
+    '''
+    Gradient matrices from the output of gradient_script.
+    '''
+
+    matrices = matrices.copy()
+
+    if P0 == 'P0' : # the Gramian is diagonal
+        matrices['areas'] = matrices['area'].diagonal()
+
+        for name in 'grad_x', 'grad_y' :
+            matrices[name] = csr_matrix( diags( 1/matrices['areas'] ).dot( matrices[name].T ) )
+
+    else :
+        for name in 'grad_x', 'grad_y' :
+            matrices[name] = spsolve( matrices['area'], matrices[name].T )
 
     return matrices
 
@@ -228,48 +397,103 @@ def flux_along_needle( Th, boundary_nodes ) :
     '''
     matrices = gradient_matrices( Th )
 
-    name_to_index, index_to_name = Th.get_boundary_label_conversion()
+    boundary_nodes = np.asarray( boundary_nodes, dtype = int )
+    start_nodes, end_nodes = boundary_nodes[:-1], boundary_nodes[1:]
+
+    dx = Th.x[end_nodes] - Th.x[start_nodes]
+    dy = Th.y[end_nodes] - Th.y[start_nodes]
+
+    # two triangles per edge, with a different sign for each side
+    left_triangles, right_triangles = Th.get_edge_triangles( start_nodes, end_nodes )
+
+    rows = np.concatenate( [ end_nodes, end_nodes ] )
+    triangles = np.concatenate( [ left_triangles, right_triangles ] )
+    signs = np.concatenate( [ -np.ones( len( end_nodes ) ), np.ones( len( end_nodes ) ) ] )
+
+    found = triangles >= 0
+    rows, triangles, signs = rows[found], triangles[found], signs[found]
+
+    flux_shape = ( len( Th.x ), len( Th.triangles ) )
+    flux_x = coo_matrix( ( signs*np.tile( dx, 2 )[found], ( rows, triangles ) ), flux_shape ).tocsr()
+    flux_y = coo_matrix( ( signs*np.tile( dy, 2 )[found], ( rows, triangles ) ), flux_shape ).tocsr()
+
+    return flux_y.dot( matrices['grad_x'] ) - flux_x.dot( matrices['grad_y'] )
+
 
-    flux = lil_matrix( shape( matrices['grad_x'] ), dtype=np.cfloat ).T
+class NeedleIntegral( LinearOperator ) :
+    '''
+    Sum of P1 values along a needle, from its first node: ( S@v )[ boundary_nodes[i] ] = sum( v[ boundary_nodes[:i+1] ] ).
+    Other nodes are set to 0.
+
+    S = NeedleIntegral( nb_nodes, boundary_nodes )
+    '''
+
+    def __init__( self, nb_nodes, boundary_nodes ) :
+        self.boundary_nodes = np.asarray( boundary_nodes, dtype = int )
+        super().__init__( dtype = float, shape = ( nb_nodes, nb_nodes ) )
 
-    for i in range( 1, len( boundary_nodes ) ) :
+    def _matmat( self, X ) :
 
-        # identify the two triangles which share edge ( i-1, i )
+        Y = np.zeros( X.shape, dtype = np.result_type( X, float ) )
+        np.add.at( Y, self.boundary_nodes, np.cumsum( X[ self.boundary_nodes ], axis = 0 ) ) # a node may appear several times along the needle
 
-        edge = [ boundary_nodes[i-1], boundary_nodes[i] ]
-        dz = diff( Th.x[edge] + 1j*Th.y[edge] )[0]
+        return Y
 
-        the_sign = -1
+    def _rmatmat( self, Y ) :
 
-        for edge in ( edge, edge[::-1] ) : # two triangles per edge !
-            triangle_index = find_triangle_index( Th.triangles, *edge )
-            flux[ boundary_nodes[i], triangle_index ] = the_sign*dz
-            the_sign *= -1 # different sign for each side of the edge
+        X = np.zeros( Y.shape, dtype = np.result_type( Y, float ) )
+        np.add.at( X, self.boundary_nodes, np.cumsum( Y[ self.boundary_nodes ][::-1], axis = 0 )[::-1] )
 
-    return imag( flux ).dot( matrices['grad_x'] ) - real(flux).dot( matrices['grad_y'] )
+        return X
 
+    def _matvec( self, x ) :
+        return self._matmat( x.reshape( ( -1, 1 ) ) ).reshape( x.shape )
 
-def integral_along_needle( Th, boundary_nodes ) :
+    def _rmatvec( self, y ) :
+        return self._rmatmat( y.reshape( ( -1, 1 ) ) ).reshape( y.shape )
+
+
+def integral_along_needle( Th, boundary_nodes, operator = False ) :
     '''
     Sum P0 contributions along needle.
 
-    cumsum_needle = integral_along_needle( Th, boundary_nodes )
+    cumsum_needle = integral_along_needle( Th, boundary_nodes, operator = False )
+
+    The sparse matrix has len( boundary_nodes )**2/2 coefficients. With operator = True, a NeedleIntegral is returned instead, which computes the sum on demand.
     '''
 
-    cumsum_needle = lil_matrix( triu( [1.]*len(boundary_nodes) ).T )
-    boundary_to_Vh = lil_matrix( ( len(Th.x), len(boundary_nodes) ) )
+    if operator :
+        return NeedleIntegral( len( Th.x ), boundary_nodes )
 
-    for j, i in enumerate( boundary_nodes ) :
-        boundary_to_Vh[ i, j ] = 1
+    boundary_nodes = np.asarray( boundary_nodes, dtype = int )
+    rows, columns = np.tril_indices( len( boundary_nodes ) )
 
-    return boundary_to_Vh.dot( cumsum_needle.dot( boundary_to_Vh.T ) )
+    return coo_matrix( ( np.ones( len( rows ) ), ( boundary_nodes[rows], boundary_nodes[columns] ) ), ( len( Th.x ), len( Th.x ) ) ).tocsr()
 
 
-def needle_discharge( Th, boundary_nodes ) :
+def needle_discharge( Th, boundary_nodes, operator = False ) :
     '''
     Convenience function to compute the matrix associated to the discharge along a needle.
 
-    Q_mat = needle_discharge( Th, boundary_nodes )
+    Q_mat = needle_discharge( Th, boundary_nodes, operator = False )
+
+    With operator = True, a linear operator is returned, which stores the flux matrix only (linear in the number of nodes).
     '''
 
-    return integral_along_needle( Th, boundary_nodes ).dot( flux_along_needle( Th, boundary_nodes ) )
+    flux = flux_along_needle( Th, boundary_nodes )
+
+    if operator :
+        return integral_along_needle( Th, boundary_nodes, operator = True )*aslinearoperator( flux )
+
+    # each row of the discharge matrix is the sum of the flux rows upstream
+    boundary_nodes = np.asarray( boundary_nodes, dtype = int )
+    boundary_flux = flux[ boundary_nodes ].tocoo()
+
+    # the flux row of boundary node j contributes to all the rows i >= j
+    nb_boundary_nodes = len( boundary_nodes )
+    repeats = nb_boundary_nodes - boundary_flux.row
+    rows = np.repeat( boundary_flux.row, repeats ) + np.arange( repeats.sum() ) - np.repeat( np.cumsum( repeats ) - repeats, repeats )
+
+    discharge = coo_matrix( ( np.repeat( boundary_flux.data, repeats ), ( boundary_nodes[rows], np.repeat( boundary_flux.col, repeats ) ) ), flux.shape )
+
+    return discharge.tocsr()
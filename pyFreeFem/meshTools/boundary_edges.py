@@ -0,0 +1,275 @@
+import numpy as np
+from collections.abc import Mapping, MutableMapping
+
+class BoundaryEdges( MutableMapping ) :
+    '''
+    { ( triangle_index, node_in_triangle ) : label } mapping, stored as parallel arrays.
+
+    boundary_edges = BoundaryEdges( edges, on_change = Th.invalidate_boundaries )
+    boundary_edges = BoundaryEdges.from_arrays( triangle_indices, nodes_in_triangle, labels )
+
+    Arrays (first len( boundary_edges ) elements):
+        triangle_indices, nodes_in_triangle : int32 arrays, the edges
+        label_codes : int32 array, position of each label in label_table
+        label_table : list of labels (integers, strings, ...). Labels of different types, like 1, 1.0 and True, are kept apart.
+
+    on_change() is called whenever the mapping is modified.
+    '''
+
+    def __init__( self, edges = None, on_change = None ) :
+
+        self.on_change = None
+
+        self.size = 0
+        self.triangle_indices = np.zeros( 0, dtype = np.int32 )
+        self.nodes_in_triangle = np.zeros( 0, dtype = np.int32 )
+        self.label_codes = np.zeros( 0, dtype = np.int32 )
+
+        self.label_table = []
+        self.label_to_code = {}
+
+        self._positions = None # { ( triangle_index, node_in_triangle ) : position in arrays }, built when needed
+
+        if not edges is None :
+            self.update( edges )
+
+        self.on_change = on_change
+
+    @classmethod
+    def from_arrays( cls, triangle_indices, nodes_in_triangle, labels, on_change = None ) :
+
+        boundary_edges = cls()
+        boundary_edges.update_arrays( triangle_indices, nodes_in_triangle, labels )
+        boundary_edges.on_change = on_change
+
+        return boundary_edges
+
+    def changed( self ) :
+        if not self.on_change is None :
+            self.on_change()
+
+    ###################################
+    #
+    # ARRAYS
+    #
+    ###################################
+
+    def get_arrays( self ) :
+        '''
+        triangle_indices, nodes_in_triangle, label_codes = boundary_edges.get_arrays()
+        '''
+        return self.triangle_indices[ :self.size ], self.nodes_in_triangle[ :self.size ], self.label_codes[ :self.size ]
+
+    def get_keys( self ) :
+        '''
+        Edges as integers: 3*triangle_index + node_in_triangle
+        '''
+        triangle_indices, nodes_in_triangle, _ = self.get_arrays()
+        return 3*triangle_indices.astype( np.int64 ) + nodes_in_triangle
+
+    def get_label_code( self, label ) :
+
+        if isinstance( label, np.generic ) : # numpy scalars are stored as python objects
+            label = label.item()
+
+        label_key = ( type( label ), label ) # 1, 1.0 and True are equal, but remain distinct labels
+
+        try :
+            return self.label_to_code[label_key]
+
+        except KeyError :
+            self.label_to_code[label_key] = len( self.label_table )
+            self.label_table += [ label ]
+            return self.label_to_code[label_key]
+
+    def encode_labels( self, labels ) :
+        '''
+        Label codes of a list of labels, or of a single label.
+        '''
+
+        if np.ndim( labels ) == 0 :
+            return np.int32( self.get_label_code( labels ) )
+
+        labels_array = np.asarray( labels )
+
+        if labels_array.dtype.kind in 'iu' and labels_array.ndim == 1 :
+            unique_labels, inverse = np.unique( labels_array, return_inverse = True )
+            codes = np.array( [ self.get_label_code( label ) for label in unique_labels.tolist() ], dtype = np.int32 )
+            return codes[ inverse ]
+
+        return np.array( [ self.get_label_code( label ) for label in labels ], dtype = np.int32 )
+
+    def reserve( self, size ) :
+        '''
+        Make room for size edges, with some margin so that adding edges one by one is cheap.
+        '''
+
+        if size > len( self.triangle_indices ) :
+
+            capacity = max( size, 2*len( self.triangle_indices ) )
+
+            for name in 'triangle_indices', 'nodes_in_triangle', 'label_codes' :
+                new_array = np.zeros( capacity, dtype = np.int32 )
+                new_array[ :self.size ] = getattr( self, name )[ :self.size ]
+                setattr( self, name, new_array )
+
+    def update_arrays( self, triangle_indices, nodes_in_triangle, labels ) :
+        '''
+        Vectorized update. labels is a list (or array) of labels, or a single label.
+        '''
+
+        triangle_indices = np.asarray( triangle_indices, dtype = np.int32 ).ravel()
+        nodes_in_triangle = np.asarray( nodes_in_triangle, dtype = np.int32 ).ravel()
+        label_codes = np.broadcast_to( self.encode_labels( labels ), triangle_indices.shape )
+
+        self.update_codes( triangle_indices, nodes_in_triangle, label_codes )
+
+    def update_codes( self, triangle_indices, nodes_in_triangle, label_codes ) :
+
+        if len( triangle_indices ) == 0 :
+            return
+
+        keys = 3*triangle_indices.astype( np.int64 ) + nodes_in_triangle
+
+        # like dict.update, the last occurrence of an edge wins
+        _, last_occurrences = np.unique( keys[::-1], return_index = True )
+        kept = np.sort( len( keys ) - 1 - last_occurrences )
+
+        keys, triangle_indices, nodes_in_triangle, label_codes = keys[kept], triangle_indices[kept], nodes_in_triangle[kept], label_codes[kept]
+
+        # existing edges only change label
+        existing = np.zeros( len( keys ), dtype = bool )
+
+        if self.size > 0 :
+            existing_keys = self.get_keys()
+            order = np.argsort( existing_keys )
+            positions = np.minimum( np.searchsorted( existing_keys[order], keys ), self.size - 1 )
+            existing = existing_keys[order][positions] == keys
+            self.label_codes[ order[ positions[existing] ] ] = label_codes[existing]
+
+        new = ~existing
+        nb_new = np.count_nonzero( new )
+
+        if nb_new > 0 :
+
+            self.reserve( self.size + nb_new )
+
+            new_slice = slice( self.size, self.size + nb_new )
+            self.triangle_indices[ new_slice ] = triangle_indices[new]
+            self.nodes_in_triangle[ new_slice ] = nodes_in_triangle[new]
+            self.label_codes[ new_slice ] = label_codes[new]
+
+            self.size += nb_new
+            self._positions = None
+
+        self.changed()
+
+    def get_positions( self ) :
+
+        if self._positions is None :
+            triangle_indices, nodes_in_triangle, _ = self.get_arrays()
+            self._positions = dict( zip( zip( triangle_indices.tolist(), nodes_in_triangle.tolist() ), range( self.size ) ) )
+
+        return self._positions
+
+    def get_used_labels( self ) :
+        '''
+        Labels of the edges, without repetition.
+        '''
+        return [ self.label_table[code] for code in np.unique( self.get_arrays()[2] ).tolist() ]
+
+    ###################################
+    #
+    # DICTIONNARY INTERFACE
+    #
+    ###################################
+
+    def __len__( self ) :
+        return self.size
+
+    def __iter__( self ) :
+        triangle_indices, nodes_in_triangle, _ = self.get_arrays()
+        return zip( triangle_indices.tolist(), nodes_in_triangle.tolist() )
+
+    def __contains__( self, key ) :
+        return tuple( key ) in self.get_positions()
+
+    def __getitem__( self, key ) :
+        return self.label_table[ self.label_codes[ self.get_positions()[ tuple( key ) ] ] ]
+
+    def __setitem__( self, key, label ) :
+
+        key = tuple( int( index ) for index in key )
+        positions = self.get_positions()
+
+        if key in positions :
+            self.label_codes[ positions[key] ] = self.get_label_code( label )
+
+        else :
+            self.reserve( self.size + 1 )
+            self.triangle_indices[ self.size ], self.nodes_in_triangle[ self.size ] = key
+            self.label_codes[ self.size ] = self.get_label_code( label )
+            positions[key] = self.size
+            self.size += 1
+
+        self.changed()
+
+    def __delitem__( self, key ) :
+
+        position = self.get_positions()[ tuple( key ) ]
+
+        for name in 'triangle_indices', 'nodes_in_triangle', 'label_codes' :
+            setattr( self, name, np.delete( getattr( self, name )[ :self.size ], position ) )
+
+        self.size -= 1
+        self._positions = None
+
+        self.changed()
+
+    def keys( self ) :
+        return list( self )
+
+    def values( self ) :
+        label_table = self.label_table
+        return [ label_table[code] for code in self.get_arrays()[2].tolist() ]
+
+    def items( self ) :
+        return list( zip( self, self.values() ) )
+
+    def update( self, *args, **kwargs ) :
+
+        if len( args ) == 1 and isinstance( args[0], BoundaryEdges ) :
+            other = args[0]
+            triangle_indices, nodes_in_triangle, label_codes = other.get_arrays()
+            code_conversion = np.array( [ self.get_label_code( label ) for label in other.label_table ] + [ 0 ], dtype = np.int32 )
+            self.update_codes( triangle_indices, nodes_in_triangle, code_conversion[ label_codes ] )
+
+        elif len( args ) == 1 and isinstance( args[0], Mapping ) :
+            edges = np.array( list( args[0].keys() ), dtype = np.int32 ).reshape( ( -1, 2 ) )
+            self.update_arrays( edges[:,0], edges[:,1], list( args[0].values() ) )
+
+        else :
+            super().update( *args, **kwargs )
+
+    def clear( self ) :
+        self.size = 0
+        self._positions = None
+        self.changed()
+
+    def copy( self ) :
+        return BoundaryEdges( self )
+
+    def __eq__( self, other ) :
+
+        if isinstance( other, Mapping ) :
+            return dict( self.items() ) == dict( other.items() )
+
+        return NotImplemented
+
+    def __repr__( self ) :
+        return repr( dict( self.items() ) )
+
+    def __getstate__( self ) :
+        state = self.__dict__.copy()
+        state['_positions'] = None
+        return state
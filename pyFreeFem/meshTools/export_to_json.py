@@ -43,10 +43,7 @@ def export_to_json( Th, keys = None ) :
     for key in keys :
         Th_dict[key] = Th.__dict__[key]
 
-    Th_dict['boundary_edges'] = []
-
-    for key, value in Th.boundary_edges.items() : # because json objects can't handle tuple keys
-
-        Th_dict['boundary_edges'] += [ list(key) + [value] ]
+    # because json objects can't handle tuple keys
+    Th_dict['boundary_edges'] = Th.get_boundary_edges( label_type = 'raw', index_type = 'triangle' )
 
     return dumps( Th_dict, cls = NpEncoder )
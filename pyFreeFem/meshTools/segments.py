@@ -1,7 +1,6 @@
 
 import numpy as np
 import warnings
-from itertools import permutations
 
 def concatenate_segments( tail, head) :
     '''
@@ -23,8 +22,9 @@ def edges_to_segments( edges ) :
     '''
     segments = edges_to_segments( edges )
 
-    Assemble individual edges into boundary segments. Might be unstable if nodes (integer) are repeated
-    in edges more than twice, that is, if the boundary is branching.
+    Assemble individual edges into boundary segments, in linear time. A closed segment
+    ends with its first node. Where the boundary branches, the chain follows the first
+    edge (in the order of edges), and the other branches become separate segments.
 
     Parameters :
         edges (list) : list of edges. An edge is a list of two nodes (integers).
@@ -33,28 +33,43 @@ def edges_to_segments( edges ) :
         segments (list) : list of segments. A segment is a list of nodes.
     '''
 
-    segments = edges.copy()
+    outgoing_edges = {}
+    incoming_edges_count = {}
 
-    keep_going = True
+    for i, ( start_node, end_node ) in enumerate( edges ) :
+        outgoing_edges.setdefault( start_node, [] ).append( i )
+        incoming_edges_count[end_node] = incoming_edges_count.get( end_node, 0 ) + 1
 
-    while keep_going :
+    used = [ False ]*len( edges )
+    next_outgoing = dict.fromkeys( outgoing_edges, 0 ) # first outgoing edge not used yet
 
-        keep_going = False
+    def chain_from( i ) :
 
-        for perm in permutations( range( len( segments ) ), 2 ) :
+        segment = list( edges[i] )
+        used[i] = True
 
-            new_segment = concatenate_segments( segments[perm[0]], segments[perm[1]] )
+        while True :
 
-            if not new_segment is None :
+            node = segment[-1]
+            candidates = outgoing_edges.get( node, [] )
 
-                for i in sorted( perm, reverse = True ) :
-                    segments.pop( i )
+            while next_outgoing.get( node, 0 ) < len( candidates ) and used[ candidates[ next_outgoing[node] ] ] :
+                next_outgoing[node] += 1
 
-                segments += [ new_segment ]
+            if next_outgoing.get( node, 0 ) == len( candidates ) :
+                return segment
 
-                keep_going = True
+            i = candidates[ next_outgoing[node] ]
+            used[i] = True
+            segment.append( edges[i][1] )
 
-                break
+    segments = []
+
+    # open segments first, then what is left (closed loops and branches)
+    for open_only in True, False :
+        for i, ( start_node, _ ) in enumerate( edges ) :
+            if not used[i] and not ( open_only and start_node in incoming_edges_count ) :
+                segments += [ chain_from( i ) ]
 
     return segments
 
@@ -124,6 +139,131 @@ def find_triangle_index( triangles, start_node, end_node ) :
 
     return triangle_index
 
+class DirectedEdgeIndex :
+    '''
+    Index of the directed edges of a triangulation, for batch queries.
+
+    index = DirectedEdgeIndex( triangles )
+    triangle_indices, nodes_in_triangle = index.locate( start_nodes, end_nodes )
+
+    Edge k of triangle t goes from node triangles[t,k] to node triangles[t,k+1]. The directed edges are
+    sorted once, and the queried edges are then found by binary search.
+    '''
+
+    def __init__( self, triangles, nb_nodes = None ) :
+
+        self.triangles = np.asarray( triangles, dtype = np.int64 ).reshape( ( -1, 3 ) )
+
+        if nb_nodes is None :
+            nb_nodes = 1 + self.triangles.max( initial = -1 )
+
+        self.nb_nodes = nb_nodes
+
+        # edge k of triangle t has flat index 3*t + k
+        edge_codes = self.get_codes( self.triangles, np.roll( self.triangles, -1, axis = 1 ) ).ravel()
+
+        self.order = np.argsort( edge_codes, kind = 'stable' )
+        self.sorted_codes = edge_codes[ self.order ]
+
+    def get_codes( self, start_nodes, end_nodes ) :
+        return start_nodes*self.nb_nodes + end_nodes
+
+    def locate_flat( self, start_nodes, end_nodes ) :
+        '''
+        Flat index ( 3*triangle_index + node_in_triangle ) of each edge, -1 if not found.
+        '''
+
+        start_nodes = np.asarray( start_nodes, dtype = np.int64 ).ravel()
+        end_nodes = np.asarray( end_nodes, dtype = np.int64 ).ravel()
+
+        if len( self.sorted_codes ) == 0 :
+            return np.full( len( start_nodes ), -1 )
+
+        valid = ( start_nodes >= 0 ) & ( start_nodes < self.nb_nodes ) & ( end_nodes >= 0 ) & ( end_nodes < self.nb_nodes )
+
+        query_codes = self.get_codes( start_nodes, end_nodes )
+        positions = np.minimum( np.searchsorted( self.sorted_codes, query_codes ), len( self.sorted_codes ) - 1 )
+
+        found = valid & ( self.sorted_codes[positions] == query_codes )
+
+        return np.where( found, self.order[ positions ], -1 )
+
+    def locate( self, start_nodes, end_nodes ) :
+        '''
+        triangle_indices, nodes_in_triangle = index.locate( start_nodes, end_nodes )
+
+        Returns:
+            triangle_indices : index of the triangle containing each edge (-1 if not found)
+            nodes_in_triangle : position of the start node in this triangle (-1 if not found)
+        '''
+
+        flat_indices = self.locate_flat( start_nodes, end_nodes )
+        found = flat_indices >= 0
+
+        return np.where( found, flat_indices//3, -1 ), np.where( found, flat_indices%3, -1 )
+
+    def get_adjacent_triangles( self, start_nodes, end_nodes ) :
+        '''
+        left_triangles, right_triangles = index.get_adjacent_triangles( start_nodes, end_nodes )
+
+        Triangles on both sides of each edge: left_triangles contain the edge, right_triangles contain the reversed edge (-1 if none).
+        '''
+
+        return self.locate( start_nodes, end_nodes )[0], self.locate( end_nodes, start_nodes )[0]
+
+    def get_boundary( self ) :
+        '''
+        triangle_indices, nodes_in_triangle = index.get_boundary()
+
+        Edges of the triangulation whose reversed edge does not belong to any triangle, that is, the edges of its outline.
+        '''
+
+        start_nodes = self.triangles.ravel()
+        end_nodes = np.roll( self.triangles, -1, axis = 1 ).ravel()
+
+        flat_indices = np.flatnonzero( self.locate_flat( end_nodes, start_nodes ) < 0 )
+
+        return flat_indices//3, flat_indices%3
+
+    def to_triangle_edges( self, start_nodes, end_nodes, flip_reversed_edges = True ) :
+        '''
+        Same as locate, but edges which are not found are reversed (with a warning) if flip_reversed_edges.
+        '''
+
+        start_nodes = np.asarray( start_nodes, dtype = np.int64 ).ravel()
+        end_nodes = np.asarray( end_nodes, dtype = np.int64 ).ravel()
+
+        triangle_indices, nodes_in_triangle = self.locate( start_nodes, end_nodes )
+
+        missing = triangle_indices < 0
+
+        if missing.any() and flip_reversed_edges :
+            warnings.warn('Reversing some edges')
+            triangle_indices[missing], nodes_in_triangle[missing] = self.locate( end_nodes[missing], start_nodes[missing] )
+            missing = triangle_indices < 0
+
+        if missing.any() :
+            warnings.warn('Could not find some boundary edges. They are lost.' )
+
+        return triangle_indices, nodes_in_triangle
+
+def locate_directed_edges( triangles, start_nodes, end_nodes ) :
+    '''
+    triangle_indices, nodes_in_triangle = locate_directed_edges( triangles, start_nodes, end_nodes )
+
+    Vectorized version of find_triangle_index, for many edges at once (see DirectedEdgeIndex).
+
+    Arguments:
+        triangles : triangulation
+        start_nodes, end_nodes : arrays of node indices
+
+    Returns:
+        triangle_indices : index of the triangle containing each edge (-1 if not found)
+        nodes_in_triangle : position of the start node in this triangle (-1 if not found)
+    '''
+
+    return DirectedEdgeIndex( triangles ).locate( start_nodes, end_nodes )
+
 def edge_nodes_to_triangle_edge( edge_nodes, triangles, flip_reversed_edges = True ) :
     '''
     ( start_node, end_node ) -> ( triangle_index, start_node_in_triangle )
@@ -184,7 +324,11 @@ def node_index_to_triangle_index_edges( edges, triangles, label = 1 ) :
     label : the label of the edges
     '''
 
-    return [ list( edge_nodes_to_triangle_edge( edge, triangles ) ) + [ label ] for edge in edges ]
+    edges = np.asarray( edges, dtype = np.int64 ).reshape( ( -1, 2 ) )
+
+    triangle_indices, nodes_in_triangle = DirectedEdgeIndex( triangles ).to_triangle_edges( edges[:,0], edges[:,1] )
+
+    return [ [ triangle_index, node_in_triangle, label ] for triangle_index, node_in_triangle in zip( triangle_indices.tolist(), nodes_in_triangle.tolist() ) if triangle_index >= 0 ]
 
 
 if __name__ == '__main__' :
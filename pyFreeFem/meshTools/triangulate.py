@@ -0,0 +1,262 @@
+import numpy as np
+
+def signed_area( x, y ) :
+    '''
+    Signed area of a polygon, positive if counterclockwise.
+    '''
+    return ( np.dot( x, np.roll( y, -1 ) ) - np.dot( y, np.roll( x, -1 ) ) )/2
+
+def cross( xa, ya, xb, yb, xc, yc ) :
+    '''
+    Twice the signed area of triangle abc, positive if counterclockwise.
+    '''
+    return ( xb - xa )*( yc - ya ) - ( yb - ya )*( xc - xa )
+
+flat_tolerance = 1e-12 # sine of the smallest angle, below which points are considered aligned
+
+def in_triangle( x, y, xa, ya, xb, yb, xc, yc ) :
+    '''
+    True for points (x, y) inside the counterclockwise triangle abc, or on its edges (up to flat_tolerance), but not on its corners.
+    '''
+
+    inside = True
+
+    for x_start, y_start, x_end, y_end in ( xa, ya, xb, yb ), ( xb, yb, xc, yc ), ( xc, yc, xa, ya ) :
+        length_squared = ( x_end - x_start )**2 + ( y_end - y_start )**2
+        inside &= cross( x_start, y_start, x_end, y_end, x, y ) >= -flat_tolerance*length_squared
+
+    for x_corner, y_corner in ( xa, ya ), ( xb, yb ), ( xc, yc ) :
+        inside &= ( x != x_corner ) | ( y != y_corner )
+
+    return inside
+
+def in_cone( x, y, xa, ya, xb, yb, xc, yc ) :
+    '''
+    True if the direction from b to (x, y) points into the polygon, whose boundary goes counterclockwise through a, b, c.
+    '''
+
+    if cross( xa, ya, xb, yb, xc, yc ) >= 0 : # convex corner
+        return cross( xb, yb, x, y, xa, ya ) > 0 and cross( x, y, xb, yb, xc, yc ) > 0
+
+    return not ( cross( xb, yb, x, y, xc, yc ) >= 0 and cross( x, y, xb, yb, xa, ya ) >= 0 )
+
+def crosses( xP, yP, xM, yM, x_start, y_start, x_end, y_end ) :
+    '''
+    True if segment PM crosses one of the edges, or touches one of their ends (other than P and M).
+    '''
+
+    crossing = ( cross( xP, yP, xM, yM, x_start, y_start )*cross( xP, yP, xM, yM, x_end, y_end ) < 0 ) & ( cross( x_start, y_start, x_end, y_end, xP, yP )*cross( x_start, y_start, x_end, y_end, xM, yM ) < 0 )
+
+    if crossing.any() :
+        return True
+
+    length_squared = ( xM - xP )**2 + ( yM - yP )**2
+    projection = ( x_start - xP )*( xM - xP ) + ( y_start - yP )*( yM - yP )
+
+    touching = ( np.abs( cross( xP, yP, xM, yM, x_start, y_start ) ) <= flat_tolerance*length_squared ) & ( projection > 0 ) & ( projection < length_squared )
+    touching &= ( ( x_start != xP ) | ( y_start != yP ) ) & ( ( x_start != xM ) | ( y_start != yM ) )
+
+    return touching.any()
+
+def bridge_hole( ring, hole, x, y, other_holes = () ) :
+    '''
+    Connect a hole to the outer ring, which becomes ..., P, M, hole..., M, P, ...
+
+    M is the rightmost node of the hole, and P the closest node of the ring that M can see: the bridge PM
+    enters the polygon at P, and crosses no edge of the ring or of the holes.
+
+    Arguments:
+        ring : node indices of the outer ring (counterclockwise)
+        hole : node indices of the hole (clockwise)
+        x, y : node coordinates
+        other_holes : holes not connected yet
+    '''
+
+    M = hole[ np.argmax( x[hole] ) ]
+    xM, yM = x[M], y[M]
+
+    edge_starts = np.concatenate( [ ring, hole ] + list( other_holes ) )
+    edge_ends = np.concatenate( [ np.roll( ring, -1 ), np.roll( hole, -1 ) ] + [ np.roll( other_hole, -1 ) for other_hole in other_holes ] )
+
+    previous, following = np.roll( ring, 1 ), np.roll( ring, -1 )
+
+    M_in_hole = list( hole ).index( M )
+    M_previous, M_following = hole[ M_in_hole - 1 ], hole[ ( M_in_hole + 1 ) % len( hole ) ]
+
+    for k in np.argsort( np.hypot( x[ring] - xM, y[ring] - yM ), kind = 'stable' ) :
+
+        a, P, c = previous[k], ring[k], following[k]
+
+        if not in_cone( xM, yM, x[a], y[a], x[P], y[P], x[c], y[c] ) or not in_cone( x[P], y[P], x[M_previous], y[M_previous], xM, yM, x[M_following], y[M_following] ) :
+            continue
+
+        if crosses( x[P], y[P], xM, yM, x[edge_starts], y[edge_starts], x[edge_ends], y[edge_ends] ) :
+            continue
+
+        return np.concatenate( [ ring[:k+1], np.roll( hole, -M_in_hole ), [ M ], ring[k:] ] )
+
+    raise ValueError( 'Hole outside the polygon.' )
+
+def triangulate_polygon( x, y, holes = None ) :
+    '''
+    triangles = triangulate_polygon( x, y, holes = None )
+
+    Triangulate a polygon by ear clipping.
+
+    Arguments:
+        x, y : coordinates of the polygon vertices, counterclockwise
+        holes : list of [ x_hole, y_hole ] coordinates, one per hole
+
+    Returns:
+        triangles : (number of triangles)*3 array of counterclockwise triangles. The node indices refer
+        to the polygon vertices, followed by the vertices of each hole.
+    '''
+
+    x, y = np.asarray( x, dtype = float ), np.asarray( y, dtype = float )
+
+    if len( x ) < 3 :
+        raise ValueError( 'A polygon needs at least three vertices.' )
+
+    if signed_area( x, y ) <= 0 :
+        raise ValueError( 'The polygon should be counterclockwise.' )
+
+    ring = np.arange( len( x ) )
+    hole_rings = []
+
+    for x_hole, y_hole in holes or [] :
+
+        x_hole, y_hole = np.asarray( x_hole, dtype = float ), np.asarray( y_hole, dtype = float )
+        hole = np.arange( len( x ), len( x ) + len( x_hole ) )
+
+        if signed_area( x_hole, y_hole ) > 0 : # holes are clockwise
+            hole = hole[::-1]
+
+        hole_rings += [ hole ]
+        x, y = np.concatenate( [ x, x_hole ] ), np.concatenate( [ y, y_hole ] )
+
+    # rightmost holes first, as bridges tend to go right
+    hole_rings = sorted( hole_rings, key = lambda hole : -x[hole].max() )
+
+    for i, hole in enumerate( hole_rings ) :
+        ring = bridge_hole( ring, hole, x, y, other_holes = hole_rings[ i + 1: ] )
+
+    return clip_ears( ring, x, y )
+
+class PointGrid :
+    '''
+    Uniform grid of points, to find those in a rectangle without scanning them all.
+
+    grid = PointGrid( x, y )
+    indices = grid.query( x_min, x_max, y_min, y_max ) # including some points just outside the rectangle
+    '''
+
+    def __init__( self, x, y, points_per_cell = 2 ) :
+
+        self.nb_cells = max( 1, int( np.sqrt( len( x )/points_per_cell ) ) ) # along each axis
+
+        self.x_min, self.y_min = x.min(), y.min()
+        self.dx = ( x.max() - self.x_min )/self.nb_cells or 1.
+        self.dy = ( y.max() - self.y_min )/self.nb_cells or 1.
+
+        codes = self.get_rows( y )*self.nb_cells + self.get_columns( x )
+
+        self.order = np.argsort( codes, kind = 'stable' )
+        self.cell_start = np.searchsorted( codes[ self.order ], np.arange( self.nb_cells**2 + 1 ) )
+
+    def get_columns( self, x ) :
+        return np.clip( np.floor( ( x - self.x_min )/self.dx ).astype( int ), 0, self.nb_cells - 1 )
+
+    def get_rows( self, y ) :
+        return np.clip( np.floor( ( y - self.y_min )/self.dy ).astype( int ), 0, self.nb_cells - 1 )
+
+    def query( self, x_min, x_max, y_min, y_max ) :
+
+        first_column, last_column = self.get_columns( np.array( [ x_min, x_max ] ) )
+        first_row, last_row = self.get_rows( np.array( [ y_min, y_max ] ) )
+
+        # cells are sorted row by row
+        return np.concatenate( [ self.order[ self.cell_start[ row*self.nb_cells + first_column ]:self.cell_start[ row*self.nb_cells + last_column + 1 ] ] for row in range( first_row, last_row + 1 ) ] )
+
+def clip_ears( ring, x, y ) :
+    '''
+    Ear clipping of a simple counterclockwise ring of nodes (nodes may appear twice, on bridges).
+    '''
+
+    nb_vertices = len( ring )
+    xr, yr = x[ring], y[ring]
+
+    previous = np.roll( np.arange( nb_vertices ), 1 )
+    following = np.roll( np.arange( nb_vertices ), -1 )
+
+    def turn( i ) :
+        return cross( xr[ previous[i] ], yr[ previous[i] ], xr[i], yr[i], xr[ following[i] ], yr[ following[i] ] )
+
+    def is_convex( i ) :
+        lengths = np.hypot( xr[i] - xr[ previous[i] ], yr[i] - yr[ previous[i] ] )*np.hypot( xr[ following[i] ] - xr[i], yr[ following[i] ] - yr[i] )
+        return turn( i ) > flat_tolerance*lengths
+
+    # only reflex (or flat) vertices can lie inside an ear, or on its edges
+    reflex = ~is_convex( np.arange( nb_vertices ) )
+    clipped = np.zeros( nb_vertices, dtype = bool )
+
+    grid = PointGrid( xr, yr )
+
+    def is_ear( i ) :
+
+        if not is_convex( i ) :
+            return False
+
+        p, f = previous[i], following[i]
+        corners_x, corners_y = xr[ [ p, i, f ] ], yr[ [ p, i, f ] ]
+
+        candidates = grid.query( corners_x.min(), corners_x.max(), corners_y.min(), corners_y.max() )
+        candidates = candidates[ reflex[candidates] & ~clipped[candidates] ]
+
+        return not in_triangle( xr[candidates], yr[candidates], xr[p], yr[p], xr[i], yr[i], xr[f], yr[f] ).any()
+
+    def most_convex( i ) :
+        '''
+        Vertex with the largest turn, for degenerate polygons where no ear is found.
+        '''
+
+        vertices = [ i ]
+
+        while following[ vertices[-1] ] != i :
+            vertices += [ following[ vertices[-1] ] ]
+
+        return vertices[ np.argmax( turn( np.array( vertices ) ) ) ]
+
+    triangles = []
+    remaining = nb_vertices
+    i = 0
+    failures = 0
+
+    while remaining > 3 :
+
+        if failures > remaining :
+            i = most_convex( i )
+
+        if is_ear( i ) or failures > remaining :
+
+            p, f = previous[i], following[i]
+            triangles += [ [ ring[p], ring[i], ring[f] ] ]
+
+            following[p], previous[f] = f, p
+            clipped[i] = True
+            remaining -= 1
+            failures = 0
+
+            # the turns of the neighbours change, either way
+            for j in p, f :
+                reflex[j] = not is_convex( j )
+
+            i = p # keeps a fan-like structure
+
+        else :
+            i = following[i]
+            failures += 1
+
+    p, f = previous[i], following[i]
+    triangles += [ [ ring[p], ring[i], ring[f] ] ]
+
+    return np.array( triangles, dtype = np.int32 )
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Olivier Devauchelle
+#
+# Many thanks to Eric Lajeunesse, Anaïs Abramian, Valentin Jules & Hugo Chauvet.
+#
+# When used in a scientific publication, please cite:
+#
+# Boltzmann Distribution of Sediment Transport, A. Abramian, O. Devauchelle,
+# G. Seizilles, E. Lajeunesse, Physical Review Letters, 123, 014501, 2019
+
+'''
+Assembly of common P1 finite-element matrices with numpy, without FreeFem++.
+'''
+
+import re
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+from .FreeFemIO import default_sparse_matrix
+
+def P1_geometry( Th ) :
+    '''
+    areas, grad_x, grad_y = P1_geometry( Th )
+
+    Returns:
+        areas : area of each triangle
+        grad_x, grad_y : (number of triangles)*3 arrays, gradient of the three P1 basis functions of each triangle
+    '''
+
+    x, y = Th.x[ Th.triangles ], Th.y[ Th.triangles ]
+
+    # node k faces the edge from node k + 1 to node k + 2
+    b = np.roll( y, -1, axis = 1 ) - np.roll( y, -2, axis = 1 )
+    c = np.roll( x, -2, axis = 1 ) - np.roll( x, -1, axis = 1 )
+
+    double_areas = b[:,0]*c[:,1] - b[:,1]*c[:,0] # signed
+
+    return abs( double_areas )/2, b/double_areas[:,None], c/double_areas[:,None]
+
+# integrals of products of barycentric coordinates over a triangle of unit area
+P1_mass_weights = ( np.ones( ( 3, 3 ) ) + np.eye( 3 ) )/12
+
+P1_weighted_mass_weights = np.full( ( 3, 3, 3 ), 1/60 )
+for i in range( 3 ) :
+    for j in range( 3 ) :
+        P1_weighted_mass_weights[ i, j, j ] = P1_weighted_mass_weights[ j, i, j ] = P1_weighted_mass_weights[ j, j, i ] = 1/30
+    P1_weighted_mass_weights[ i, i, i ] = 1/10
+
+class P1Assembler :
+    '''
+    Assembles P1 matrices on a fixed mesh, for varying coefficients.
+
+    assembler = P1Assembler( Th )
+    K = assembler.stiffness( D ) # int2d(Th)( dx(u)*D*dx(v) + dy(u)*D*dy(v) )
+    M = assembler.mass( c ) # int2d(Th)( c*u*v )
+    A = assembler.drift( D ) # int2d(Th)( dx(D)*u*dx(v) + dy(D)*u*dy(v) )
+
+    The geometry of the triangles and the sparsity pattern are computed once. Each new coefficient
+    then only requires the computation of the matrix coefficients (the data of the CSR matrix).
+    Coefficients are P1 (one value per node) or P0 (one value per triangle).
+    '''
+
+    def __init__( self, Th ) :
+
+        self.triangles = Th.triangles
+        self.nb_nodes = len( Th.x )
+
+        self.areas, self.grad_x, self.grad_y = P1_geometry( Th )
+
+        self.element_stiffness = self.areas[:,None,None]*( self.grad_x[:,:,None]*self.grad_x[:,None,:] + self.grad_y[:,:,None]*self.grad_y[:,None,:] )
+
+        # sparsity pattern, and position of each element matrix coefficient in the CSR data
+        rows = np.broadcast_to( self.triangles[:,:,None], self.element_stiffness.shape ).ravel()
+        columns = np.broadcast_to( self.triangles[:,None,:], self.element_stiffness.shape ).ravel()
+
+        codes, self.data_index = np.unique( rows.astype( np.int64 )*self.nb_nodes + columns, return_inverse = True )
+
+        self.indices = ( codes % self.nb_nodes ).astype( np.int32 )
+        self.indptr = np.searchsorted( codes//self.nb_nodes, np.arange( self.nb_nodes + 1 ) ).astype( np.int32 )
+
+    def get_coefficient_type( self, coefficient ) :
+
+        if coefficient is None :
+            return None
+
+        elif len( coefficient ) == self.nb_nodes :
+            return 'P1'
+
+        elif len( coefficient ) == len( self.triangles ) :
+            return 'P0'
+
+        raise ValueError( 'The coefficient should have one value per node (P1) or per triangle (P0).' )
+
+    def assemble( self, element_matrices ) :
+        '''
+        Sums (number of triangles)*3*3 element matrices into a CSR matrix.
+        '''
+
+        data = np.bincount( self.data_index, weights = element_matrices.ravel(), minlength = len( self.indices ) )
+
+        return csr_matrix( ( data, self.indices, self.indptr ), shape = ( self.nb_nodes, self.nb_nodes ), copy = False )
+
+    def stiffness( self, coefficient = None, coefficient_type = None ) :
+        '''
+        Matrix of int2d(Th)( dx(u)*D*dx(v) + dy(u)*D*dy(v) ), where D is the coefficient (1 if None).
+        '''
+
+        if coefficient_type is None :
+            coefficient_type = self.get_coefficient_type( coefficient )
+
+        if coefficient_type is None :
+            return self.assemble( self.element_stiffness )
+
+        elif coefficient_type == 'P0' :
+            triangle_coefficient = np.asarray( coefficient )
+
+        elif coefficient_type == 'P1' : # the gradients are uniform over each triangle
+            triangle_coefficient = np.asarray( coefficient )[ self.triangles ].mean( axis = 1 )
+
+        return self.assemble( triangle_coefficient[:,None,None]*self.element_stiffness )
+
+    def mass( self, coefficient = None, coefficient_type = None ) :
+        '''
+        Matrix of int2d(Th)( c*u*v ), where c is the coefficient (1 if None).
+        '''
+
+        if coefficient_type is None :
+            coefficient_type = self.get_coefficient_type( coefficient )
+
+        if coefficient_type is None :
+            element_matrices = self.areas[:,None,None]*P1_mass_weights
+
+        elif coefficient_type == 'P0' :
+            element_matrices = ( np.asarray( coefficient )*self.areas )[:,None,None]*P1_mass_weights
+
+        elif coefficient_type == 'P1' :
+            element_matrices = self.areas[:,None,None]*np.einsum( 'ijk,tk->tij', P1_weighted_mass_weights, np.asarray( coefficient )[ self.triangles ] )
+
+        return self.assemble( element_matrices )
+
+    def drift( self, coefficient ) :
+        '''
+        Matrix of int2d(Th)( dx(D)*u*dx(v) + dy(D)*u*dy(v) ), where D is a P1 coefficient.
+        '''
+
+        coefficient = np.asarray( coefficient )[ self.triangles ]
+
+        # gradient of D and of the test function v are uniform over each triangle
+        drift_x = ( coefficient*self.grad_x ).sum( axis = 1 )
+        drift_y = ( coefficient*self.grad_y ).sum( axis = 1 )
+
+        test_drift = ( self.areas/3 )[:,None]*( drift_x[:,None]*self.grad_x + drift_y[:,None]*self.grad_y )
+
+        # rows are test functions, columns are unknowns
+        return self.assemble( np.broadcast_to( test_drift[:,:,None], self.element_stiffness.shape ) )
+
+def P1_stiffness( Th, coefficient = None ) :
+    '''
+    Matrix of int2d(Th)( dx(u)*D*dx(v) + dy(u)*D*dy(v) ) on P1 elements, where D is the coefficient (1 if None, P0 or P1).
+    To assemble it for many coefficients, use P1Assembler.
+    '''
+
+    return P1Assembler( Th ).stiffness( coefficient )
+
+def P1_mass( Th, coefficient = None ) :
+    '''
+    Matrix of int2d(Th)( c*u*v ) on P1 elements, where c is the coefficient (1 if None, P0 or P1).
+    To assemble it for many coefficients, use P1Assembler.
+    '''
+
+    return P1Assembler( Th ).mass( coefficient )
+
+def P1_gradient( Th ) :
+    '''
+    grad_x, grad_y, areas = P1_gradient( Th )
+
+    P1 to P0 gradient matrices (one row per triangle, one column per node), and the areas of the triangles.
+
+    dxv = grad_x*v
+    '''
+
+    areas, grad_x, grad_y = P1_geometry( Th )
+
+    nb_triangles = len( Th.triangles )
+    indptr = np.arange( 0, 3*nb_triangles + 1, 3, dtype = np.int32 )
+    indices = Th.triangles.astype( np.int32 ).ravel()
+
+    gradients = []
+
+    for grad in grad_x, grad_y :
+        gradient = csr_matrix( ( grad.ravel(), indices.copy(), indptr ), shape = ( nb_triangles, len( Th.x ) ) )
+        gradient.sort_indices()
+        gradients += [ gradient ]
+
+    return gradients[0], gradients[1], areas
+
+def P1_boundary_mass( Th, labels = None ) :
+    '''
+    Matrix of int1d(Th, labels)( u*v ) on P1 elements.
+
+    Arguments:
+        labels (list) : boundary labels, as in FreeFem++ (integers). All boundaries if None.
+    '''
+
+    edges = Th.get_boundary_edge_array( label_type = 'int' )
+
+    if not labels is None :
+        edges = edges[ np.isin( edges[:,2], labels ) ]
+
+    nodes = edges[:,:2]
+    lengths = np.hypot( *np.diff( [ Th.x[nodes], Th.y[nodes] ], axis = 2 )[:,:,0] )
+
+    element_matrices = lengths[:,None,None]*( np.ones( ( 2, 2 ) ) + np.eye( 2 ) )/6
+
+    rows = np.broadcast_to( nodes[:,:,None], element_matrices.shape )
+    columns = np.broadcast_to( nodes[:,None,:], element_matrices.shape )
+
+    nb_nodes = len( Th.x )
+
+    return default_sparse_matrix( coo_matrix( ( element_matrices.ravel(), ( rows.ravel(), columns.ravel() ) ), ( nb_nodes, nb_nodes ) ) )
+
+###################################
+#
+# RECOGNIZED VARFS
+#
+###################################
+
+native_varfs = [
+    ( r'int2d\(\w+\)\((dx\(u\)\*dx\(v\)\+dy\(u\)\*dy\(v\)|dx\(v\)\*dx\(u\)\+dy\(v\)\*dy\(u\))\)', lambda Th, match : P1_stiffness( Th ) ),
+    ( r'int2d\(\w+\)\((u\*v|v\*u)\)', lambda Th, match : P1_mass( Th ) ),
+    ( r'int1d\(\w+\)\((u\*v|v\*u)\)', lambda Th, match : P1_boundary_mass( Th ) ),
+    ( r'int1d\(\w+,([\d,]+)\)\((u\*v|v\*u)\)', lambda Th, match : P1_boundary_mass( Th, labels = [ int( label ) for label in match.group(1).split(',') ] ) ),
+    ]
+
+def native_varf( Th, varf ) :
+    '''
+    Matrix of the variational formulation varf on P1 elements, if it is recognized. Returns None otherwise.
+
+    Recognized varfs (any spacing, u and v may be swapped):
+        int2d(Th)( dx(u)*dx(v) + dy(u)*dy(v) )
+        int2d(Th)( u*v )
+        int1d(Th)( u*v )
+        int1d(Th, 1, 2)( u*v )
+    '''
+
+    varf = re.sub( r'\s+', '', varf )
+
+    for pattern, assemble in native_varfs :
+
+        match = re.fullmatch( pattern, varf )
+
+        if match :
+            return assemble( Th, match )
+
+    return None
@@ -0,0 +1,74 @@
+# Regression test: the ear clipper should never produce flat triangles,
+# even with aligned boundary points and holes.
+
+import sys
+sys.path.append('./../')
+
+from pylab import *
+import pyFreeFem as pyff
+from pyFreeFem.meshTools.triangulate import triangulate_polygon, signed_area
+
+def triangle_areas( x, y, triangles ) :
+    xt, yt = x[triangles], y[triangles]
+    return ( ( xt[:,1] - xt[:,0] )*( yt[:,2] - yt[:,0] ) - ( yt[:,1] - yt[:,0] )*( xt[:,2] - xt[:,0] ) )/2
+
+def subdivided_square( n ) :
+    s = linspace( 0, 1, n )[:-1]
+    return array( [ *zip( s, 0*s ), *zip( 1 + 0*s, s ), *zip( 1 - s, 1 + 0*s ), *zip( 0*s, 1 - s ) ] )
+
+def staircase( rng ) :
+    '''
+    Random staircase polygon, with aligned points along its sides.
+    '''
+
+    nb_steps = rng.integers( 3, 8 )
+    heights = rng.integers( 1, 5, nb_steps )
+
+    points = []
+
+    def add_side( start, end ) :
+        nb_points = rng.integers( 1, 4 )
+        for t in arange( nb_points )/nb_points :
+            points.append( start + ( end - start )*t )
+
+    corners = [ array( [ 0., 0. ] ), array( [ nb_steps, 0. ] ) ]
+
+    for i in range( nb_steps - 1, -1, -1 ) :
+        corners += [ array( [ i + 1., heights[i] ] ), array( [ i, heights[i] ] ) ]
+
+    corners += [ corners[0] ]
+
+    for start, end in zip( corners[:-1], corners[1:] ) :
+        add_side( start, end )
+
+    points = array( points )
+    distinct = r_[ True, any( diff( points, axis = 0 ) != 0, axis = 1 ) ]
+
+    return points[ distinct ].T
+
+# square with a square hole, both with aligned points
+square = subdivided_square( 10 )
+Th = pyff.TriMesh_from_polygon( square, label = 'auto', holes = [ .25 + .5*square ] )
+areas = triangle_areas( Th.x, Th.y, Th.triangles )
+
+assert areas.min() > 0
+assert isclose( areas.sum(), .75 )
+
+# staircases
+rng = np.random.default_rng( 0 )
+
+for _ in range( 100 ) :
+    x, y = staircase( rng )
+    areas = triangle_areas( x, y, triangulate_polygon( x, y ) )
+
+    assert areas.min() > 0
+    assert isclose( areas.sum(), signed_area( x, y ) )
+
+# closed hole, as in the documentation
+theta = linspace( 0, 2*pi, 51 )
+points = array( [ cos(theta), sin(theta) ] ).T
+Th = pyff.TriMesh_from_boundaries( [ points[:25], points[25:] ], ( 'top', 'bottom' ), holes = [ .3*points ], hole_labels = [ 'hole' ] )
+
+assert triangle_areas( Th.x, Th.y, Th.triangles ).min() > 0
+
+print( 'No flat triangle.' )